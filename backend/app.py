@@ -6,6 +6,8 @@ import matplotlib
 matplotlib.use('Agg')  # Use non-GUI backend to prevent Tkinter errors
 import matplotlib.pyplot as plt
 
+from model.topk import top_k
+
 app = Flask(__name__)
 CORS(app)
 
@@ -158,16 +160,24 @@ def predict():
         # For this demo without the full ML model running, we will flag the top anomaly_count transactions
         # and generate deterministic reasons based on their properties.
         
-        df_sorted = df.sort_values(by="amount", ascending=False).head(anomaly_count)
+        # The top anomaly_count rows by amount, selected with top_k (argpartition) rather
+        # than a full sort, and read column by column rather than with iterrows
+        top_rows = top_k(df["amount"].to_numpy(), anomaly_count)
         flagged_list = []
-        import random 
 
         stats_mean = df["amount"].mean()
         stats_std = df["amount"].std()
+        max_amount = df["amount"].max()
+
+        labels = df.index[top_rows].tolist()
+        amounts = df["amount"].to_numpy()[top_rows].tolist()
+        ids = (df["transaction_id"].to_numpy()[top_rows].tolist() if "transaction_id" in df.columns
+               else [f"TXN-{index}" for index in labels])
+        timestamps = (df["timestamp"].to_numpy()[top_rows].tolist() if "timestamp" in df.columns
+                      else ["N/A"] * len(labels))
 
-        for index, row in df_sorted.iterrows():
-             amount = row.get("amount", 0)
-             risk_score = min(99, int(70 + (amount / df["amount"].max()) * 29)) # Score proportional to amount
+        for index, transaction_id, amount, timestamp in zip(labels, ids, amounts, timestamps):
+             risk_score = min(99, int(70 + (amount / max_amount) * 29)) # Score proportional to amount
 
              # Deterministic Reason Logic
              reasons = []
@@ -184,9 +194,9 @@ def predict():
                  reasons.append("Statistical Outlier")
 
              flagged_list.append({
-                 "transaction_id": row.get("transaction_id", f"TXN-{index}"),
+                 "transaction_id": transaction_id,
                  "amount": amount,
-                 "timestamp": row.get("timestamp", "N/A"),
+                 "timestamp": timestamp,
                  "risk_score": risk_score,
                  "reason": " | ".join(reasons)
              })
@@ -0,0 +1,62 @@
+"""
+Full EllipticEnvelope vs. FastEllipticEnvelope: fit and scoring time, and how
+far the fast layers agree with the full one on which rows are outliers.
+
+    python -m benchmarks.bench_covariance 20000 100000 300000
+
+Input is the robust-scaled feature matrix train_ensemble gives the elliptic
+layer. Agreement is the share of the full layer's outliers the fast layer
+also flags, and the rank correlation of the two layers' scores.
+"""
+import sys
+import time
+
+import numpy as np
+import scipy.stats as stats
+from sklearn.covariance import EllipticEnvelope
+from sklearn.preprocessing import RobustScaler
+
+from model.covariance import FastEllipticEnvelope
+from model.features import compute_features
+
+from .synthetic import preprocessed
+
+CONTAMINATION = 0.03
+
+
+def feature_matrix(n_rows: int) -> np.ndarray:
+    features = compute_features(preprocessed(n_rows))
+    features = features.fillna(0).replace([np.inf, -np.inf], 0)
+    return RobustScaler().fit_transform(features)
+
+
+def timed_layer(layer, X):
+    start = time.perf_counter()
+    layer.fit(X)
+    fitted = time.perf_counter()
+    scores = layer.score_samples(X)
+    outliers = layer.predict(X) == -1
+    return fitted - start, time.perf_counter() - fitted, scores, outliers
+
+
+def main(sizes):
+    layers = {
+        "full": lambda: EllipticEnvelope(contamination=CONTAMINATION, random_state=42),
+        "subsample": lambda: FastEllipticEnvelope(CONTAMINATION, "subsample", random_state=42),
+        "welford": lambda: FastEllipticEnvelope(CONTAMINATION, "welford", random_state=42),
+    }
+    print(f"{'rows':>9} {'layer':>10} {'fit (s)':>8} {'score (s)':>9} {'recall':>7} {'spearman':>9}")
+    for n_rows in sizes:
+        X = feature_matrix(n_rows)
+        reference = None
+        for name, make in layers.items():
+            fit, score, scores, outliers = timed_layer(make(), X)
+            if reference is None:
+                reference = scores, outliers
+            recall = (outliers & reference[1]).sum() / max(reference[1].sum(), 1)
+            rho = stats.spearmanr(scores, reference[0]).correlation
+            print(f"{n_rows:>9,} {name:>10} {fit:>8.2f} {score:>9.3f} {recall:>7.1%} {rho:>9.3f}")
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or [20000, 100000, 300000])
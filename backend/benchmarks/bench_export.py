@@ -0,0 +1,70 @@
+"""
+Export time and file size of the results, by output format: the full
+results file plus its HIGH_RISK subset, written in one ResultWriter pass.
+
+    python -m benchmarks.bench_export 10000000
+
+Scores and explanations are synthetic (3% flagged, each with a risk and
+two to four reasons); the transactions are benchmarks.synthetic's. "csv"
+is the format export_results wrote before, text as pandas writes it.
+"""
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from model.anomaly_model import EliteFraudDetector
+from model.export import EXPORT_FORMATS, ResultWriter
+
+from .synthetic import preprocessed
+
+REASONS = [
+    "Impossible travel detected", "Multiple failed login attempts", "Unusually high amount (top 1%)",
+    "First transaction in this country", "New device detected", "New IP address", "New payee/merchant",
+    "Card-not-present transaction", "Transaction during unusual hours",
+]
+
+
+def scored(n_rows: int, seed: int = 42):
+    rng = np.random.default_rng(seed)
+    is_anomaly = (rng.random(n_rows) < 0.03).astype(int)
+    risk = np.clip(rng.gamma(2.0, 12.0, n_rows) + 40 * is_anomaly, 0, 100)
+    explanations = np.empty(n_rows, dtype=object)
+    explanations.fill("Normal transaction")
+    flagged = np.flatnonzero(is_anomaly)
+    explanations[flagged] = [
+        f"[RISK: {r:.0f}/100] " + " | ".join(rng.choice(REASONS, rng.integers(2, 5), replace=False))
+        + f" | Large location change ({km:.0f}km)"
+        for r, km in zip(risk[flagged], rng.uniform(500, 15000, len(flagged)))
+    ]
+    return is_anomaly, pd.Series(risk), pd.Series(explanations)
+
+
+def main(n_rows: int) -> None:
+    df = preprocessed(n_rows)
+    is_anomaly, risk, explanations = scored(n_rows)
+    detector = EliteFraudDetector()
+    out_dir = tempfile.mkdtemp(prefix="fraud_export_")
+    print(f"{n_rows:,} rows, {(risk >= 70).sum():,} high-risk")
+    print(f"{'format':>9} {'time (s)':>9} {'size (MB)':>10} {'HIGH_RISK (MB)':>15}")
+    for suffix in reversed(list(EXPORT_FORMATS)):
+        if suffix == ".feather":
+            continue
+        path = os.path.join(out_dir, "results" + suffix)
+        start = time.perf_counter()
+        with ResultWriter(path) as writer:
+            writer.write(detector.results_frame(df, is_anomaly, risk, explanations))
+        elapsed = time.perf_counter() - start
+        sizes = [os.path.getsize(p) / 2**20 if os.path.exists(p) else 0 for p in writer.paths.values()]
+        print(f"{suffix.lstrip('.'):>9} {elapsed:>9.1f} {sizes[0]:>10.1f} {sizes[1]:>15.2f}")
+        for p in writer.paths.values():
+            if os.path.exists(p):
+                os.remove(p)
+    os.rmdir(out_dir)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
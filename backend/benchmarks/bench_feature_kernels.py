@@ -0,0 +1,53 @@
+"""
+Per-user lambdas vs. the same features as `engineer_features` computes them:
+compute_features over the shared user index (segments.GroupIndex).
+
+    python -m benchmarks.bench_feature_kernels 100000 1000000 10000000
+"""
+import sys
+import time
+
+import pandas as pd
+
+from model.features import compute_features
+
+from .synthetic import preprocessed
+
+# The features lambda_kernels computes, by their registered names
+KERNEL_FEATURES = [
+    "amount_vs_user_median", "amount_vs_user_max", "device_change", "browser_change", "is_new_ip_for_user",
+    "rolling_mean_10", "rolling_std_10",
+]
+
+
+def lambda_kernels(df: pd.DataFrame) -> None:
+    amounts = df.groupby("user_id")["transaction_amount"]
+    amounts.transform(lambda x: (x - x.median()) / (x.std() + 1e-6))
+    amounts.transform(lambda x: x / (x.max() + 1e-6))
+    for col in ["device_id", "browser_fingerprint", "ip_address"]:
+        df.groupby("user_id")[col].transform(lambda x: ~x.duplicated())
+    amounts.transform(lambda x: x.rolling(window=10, min_periods=1).mean())
+    amounts.transform(lambda x: x.rolling(window=10, min_periods=1).std())
+
+
+def vectorized_kernels(df: pd.DataFrame) -> None:
+    compute_features(df, names=KERNEL_FEATURES)
+
+
+def timed(func, df: pd.DataFrame) -> float:
+    start = time.perf_counter()
+    func(df)
+    return time.perf_counter() - start
+
+
+def main(sizes):
+    print(f"{'rows':>12} {'lambdas (s)':>12} {'vectorized (s)':>15} {'speedup':>8}")
+    for n_rows in sizes:
+        df = preprocessed(n_rows)
+        before = timed(lambda_kernels, df)
+        after = timed(vectorized_kernels, df)
+        print(f"{n_rows:>12,} {before:>12.2f} {after:>15.2f} {before / after:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or [100_000, 1_000_000, 10_000_000])
@@ -0,0 +1,49 @@
+"""
+Peak memory of load_and_preprocess + engineer_features, default vs. compact mode.
+
+    python -m benchmarks.bench_memory 10000000
+"""
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from .synthetic import write_csv
+
+
+def child(path: str, compact: bool) -> None:
+    from model.anomaly_model import EliteFraudDetector
+
+    detector = EliteFraudDetector(compact=compact)
+    start = time.perf_counter()
+    df = detector.load_and_preprocess(path)
+    features = detector.engineer_features(df)
+    X = detector._model_input(features)
+    elapsed = time.perf_counter() - start
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    frame_mb = (df.memory_usage(deep=True).sum() + features.memory_usage().sum()) / 2**20
+    print(f"RESULT {peak_mb:.0f} {frame_mb:.0f} {elapsed:.1f} {X.dtypes.iloc[0] if hasattr(X, 'dtypes') else X.dtype}")
+
+
+def main(n_rows: int) -> None:
+    path = os.path.join(tempfile.gettempdir(), f"fraud_bench_{n_rows}.csv")
+    if not os.path.exists(path):
+        write_csv(path, n_rows)
+    print(f"{n_rows:,} rows ({os.path.getsize(path) / 2**20:.0f} MB CSV)")
+    print(f"{'mode':>8} {'peak RSS (MB)':>14} {'frames (MB)':>12} {'time (s)':>9} {'model input':>12}")
+    for mode in ["default", "compact"]:
+        out = subprocess.run(
+            [sys.executable, "-m", "benchmarks.bench_memory", "--child", path, mode],
+            capture_output=True, text=True, check=True,
+        ).stdout
+        peak, frames, elapsed, dtype = out.split("RESULT ")[1].split()
+        print(f"{mode:>8} {peak:>14} {frames:>12} {elapsed:>9} {dtype:>12}")
+
+
+if __name__ == "__main__":
+    if sys.argv[1] == "--child":
+        child(sys.argv[2], sys.argv[3] == "compact")
+    else:
+        main(int(sys.argv[1]))
@@ -0,0 +1,44 @@
+"""
+Feature engineering wall time by number of worker processes.
+
+    python -m benchmarks.bench_parallel 1000000 1 2 4 8 16 32
+
+The first argument is the row count, the rest are worker counts (default:
+powers of two up to the number of cores). Also reports the longest
+cross-user reduction task, which no number of workers can shorten.
+"""
+import os
+import sys
+import time
+
+from model.features import compute_features, cross_user_features, plan
+from model.parallel import parallel_features, reduction_groups
+
+from .synthetic import preprocessed
+
+
+def timed(func) -> float:
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start
+
+
+def main(n_rows: int, workers):
+    df = preprocessed(n_rows)
+    reduced = [spec.name for spec in plan(None, df.columns) if spec.name in cross_user_features()]
+    serial = timed(lambda: compute_features(df))
+    reductions = [timed(lambda: compute_features(df, group)) for group in reduction_groups(reduced)]
+
+    print(f"{n_rows:,} rows: serial {serial:.2f}s; cross-user reduction {sum(reductions):.2f}s "
+          f"in {len(reductions)} tasks, longest {max(reductions):.2f}s")
+    print(f"{'workers':>8} {'time (s)':>9} {'speedup':>8}")
+    for n_jobs in workers:
+        elapsed = timed(lambda: parallel_features(df, n_jobs=n_jobs))
+        print(f"{n_jobs:>8} {elapsed:>9.2f} {serial / elapsed:>7.1f}x")
+
+
+if __name__ == "__main__":
+    args = [int(arg) for arg in sys.argv[1:]]
+    cores = os.cpu_count() or 1
+    main(args[0] if args else 1_000_000,
+         args[1:] or [2 ** i for i in range(cores.bit_length()) if 2 ** i <= cores])
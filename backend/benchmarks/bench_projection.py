@@ -0,0 +1,77 @@
+"""
+DBSCAN and the elliptic layer on the full-width feature matrix vs. on PCA
+and sparse random projections of it: fit and scoring time, and how far the
+projected members agree with the full-width ones on which rows are outliers.
+
+    python -m benchmarks.bench_projection 100000 8 16 32
+
+The first argument is the row count, the rest are target dimensions.
+Inputs are the standard-scaled (DBSCAN) and robust-scaled (elliptic)
+matrices train_ensemble builds, with the same member settings. Agreement is
+the share of the full-width member's outliers the projected one also flags,
+and the rank correlation of the two members' scores ("-" when either is
+constant, e.g. DBSCAN finding no core samples and calling every row noise).
+"""
+import sys
+import time
+
+import numpy as np
+import scipy.stats as stats
+from sklearn.covariance import EllipticEnvelope
+from sklearn.preprocessing import RobustScaler, StandardScaler
+
+from model.features import compute_features
+from model.inductive_dbscan import InductiveDBSCAN
+from model.projection import PROJECTION_METHODS, make_projection
+
+from .synthetic import preprocessed
+
+CONTAMINATION = 0.03
+
+MEMBERS = {
+    "dbscan": (StandardScaler, lambda: InductiveDBSCAN(eps=3.0, min_samples=10)),
+    "elliptic": (RobustScaler, lambda: EllipticEnvelope(contamination=CONTAMINATION, random_state=42)),
+}
+
+
+def timed_member(member, X):
+    start = time.perf_counter()
+    member.fit(X)
+    fitted = time.perf_counter()
+    scores = member.score_samples(X)
+    outliers = member.predict(X) == -1
+    return fitted - start, time.perf_counter() - fitted, scores, outliers
+
+
+def rank_correlation(a, b) -> str:
+    if np.all(a == a[0]) or np.all(b == b[0]):
+        return "-"
+    return f"{stats.spearmanr(a, b).correlation:.3f}"
+
+
+def main(n_rows, dims):
+    features = compute_features(preprocessed(n_rows))
+    features = features.fillna(0).replace([np.inf, -np.inf], 0)
+    print(f"{n_rows:,} rows, {features.shape[1]} features")
+    print(f"{'member':>9} {'input':>10} {'fit (s)':>8} {'score (s)':>9} {'flagged':>8} {'recall':>7} {'spearman':>9}")
+    for name, (scaler, make) in MEMBERS.items():
+        X = scaler().fit_transform(features)
+        fit, score, reference_scores, reference = timed_member(make(), X)
+        print(f"{name:>9} {'full':>10} {fit:>8.2f} {score:>9.3f} {reference.mean():>8.1%} {1:>7.1%} "
+              f"{rank_correlation(reference_scores, reference_scores):>9}")
+        for method in PROJECTION_METHODS:
+            for n_components in dims:
+                # Projection time counts towards the fit
+                start = time.perf_counter()
+                projected = make_projection(method, n_components, random_state=42).fit_transform(X)
+                project = time.perf_counter() - start
+                fit, score, scores, outliers = timed_member(make(), projected)
+                recall = (outliers & reference).sum() / max(reference.sum(), 1)
+                label = f"{method}-{n_components}"
+                print(f"{name:>9} {label:>10} {project + fit:>8.2f} {score:>9.3f} {outliers.mean():>8.1%} "
+                      f"{recall:>7.1%} {rank_correlation(scores, reference_scores):>9}")
+
+
+if __name__ == "__main__":
+    args = [int(arg) for arg in sys.argv[1:]]
+    main(args[0] if args else 100_000, args[1:] or [8, 16, 32])
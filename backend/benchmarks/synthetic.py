@@ -0,0 +1,51 @@
+import numpy as np
+import pandas as pd
+
+from model.ip_addresses import add_ip_keys
+
+
+def make_transactions(n_rows: int, n_users: int = None, seed: int = 42) -> pd.DataFrame:
+    """Raw transaction frame with the same columns as the uploaded CSVs plus the optional ones."""
+    rng = np.random.default_rng(seed)
+    n_users = n_users or max(1, n_rows // 20)
+    start = np.datetime64("2024-01-01T00:00:00")
+    seconds = rng.integers(0, 30 * 86400, n_rows)
+    seconds[rng.random(n_rows) < 0.1] //= 60
+
+    ip_octets = rng.integers(0, 64, (n_rows, 2))
+    return pd.DataFrame({
+        "transaction_id": np.arange(n_rows),
+        "user_id": rng.integers(0, n_users, n_rows),
+        "timestamp": start + seconds.astype("timedelta64[s]"),
+        "amount": np.round(rng.lognormal(4, 1.2, n_rows), 2),
+        "currency": rng.choice(["USD", "EUR", "GBP"], n_rows),
+        "merchant_category": rng.choice(["Grocery", "Jewelry", "Travel", "Gas", "Online"], n_rows),
+        "merchant_id": rng.integers(1000, 1000 + max(10, n_rows // 50), n_rows),
+        "country": rng.choice(["US", "GB", "DE", "FR", "IN", "NG"], n_rows, p=[.5, .2, .1, .1, .07, .03]),
+        "city": rng.choice(["New York", "London", "Berlin", "Paris"], n_rows),
+        "ip_address": pd.Series(ip_octets[:, 0]).map("10.0.{}.".format) + pd.Series(ip_octets[:, 1]).astype(str),
+        "device_id": rng.integers(10000, 10000 + max(10, n_rows // 8), n_rows),
+        "browser_fingerprint": rng.integers(0, max(5, n_rows // 10), n_rows),
+        "latitude": rng.uniform(-60, 60, n_rows),
+        "longitude": rng.uniform(-180, 180, n_rows),
+        "failed_login_attempts": rng.poisson(0.3, n_rows),
+        "is_card_present": rng.random(n_rows) < 0.5,
+        "profile_updated": rng.random(n_rows) < 0.05,
+        "is_new_payee": (rng.random(n_rows) < 0.1).astype(int),
+        "transaction_channel": rng.choice(["web", "app", "pos"], n_rows),
+    })
+
+
+def preprocessed(n_rows: int, n_users: int = None, seed: int = 42) -> pd.DataFrame:
+    """Synthetic frame in the shape `load_and_preprocess` returns."""
+    df = make_transactions(n_rows, n_users, seed).rename(columns={
+        "timestamp": "transaction_time",
+        "amount": "transaction_amount",
+        "card_present": "is_card_present"
+    })
+    return add_ip_keys(df.sort_values(["user_id", "transaction_time"]).reset_index(drop=True))
+
+
+def write_csv(path: str, n_rows: int, n_users: int = None, seed: int = 42) -> str:
+    make_transactions(n_rows, n_users, seed).to_csv(path, index=False)
+    return path
@@ -4,18 +4,37 @@ import matplotlib.pyplot as plt
 import seaborn as sns
 import warnings
 from datetime import datetime
-from typing import Dict, List, Tuple, Optional
+from typing import Callable, Dict, List, Tuple, Optional, Union
 import json
+import os
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
 
 # ML Models
 from sklearn.ensemble import IsolationForest
 from sklearn.preprocessing import StandardScaler, RobustScaler
-from sklearn.cluster import DBSCAN
-from sklearn.covariance import EllipticEnvelope
 
 # Metrics
 from sklearn.metrics import classification_report, confusion_matrix
 import scipy.stats as stats
+from threadpoolctl import threadpool_limits
+
+from .artifact import read_artifact, write_artifact
+from .calibration import outlier_rank, quantile_table, table_quantile
+from .chunked import ChunkedPipeline
+from .detectors import DETECTORS, detector_weights
+from .export import ResultWriter, sibling_path
+from .feature_cache import FeatureCache
+from .feature_store import UserFeatureStore
+from .features import category_vocabularies, compute_features, required_columns
+from .global_stats import GlobalStats, RiskHistogram
+from .importance import correlation_importance, permutation_importance
+from .ip_addresses import IP_KEY_COLUMNS, add_ip_keys
+from .parallel import parallel_features
+from .projection import make_projection
+from .rules import DEFAULT_RULES, RuleSet
+from .selection import select_features
+from .topk import top_k
 
 warnings.filterwarnings('ignore')
 
@@ -27,25 +46,114 @@ class EliteFraudDetector:
     risk scoring, and explainability for transaction fraud identification.
     """
 
-    def __init__(self, contamination_rate: float = 0.03):
+    COLUMN_MAPPING = {
+        "timestamp": "transaction_time",
+        "amount": "transaction_amount",
+        "card_present": "is_card_present"
+    }
+    # Weighted vote at which fusion="vote" flags a row
+    VOTE_CUTOFF = 0.4
+    # Trees in the cascade's first-stage forest (the full one has 300)
+    CASCADE_TREES = 50
+    # With prune, a feature is near-constant (and dropped) when this share of rows has one value
+    NEAR_CONSTANT_SHARE = 0.9999
+    # Text columns loaded as pandas Categoricals in compact mode
+    CATEGORICAL_COLUMNS = [
+        "currency", "merchant_category", "country", "city", "ip_address",
+        "transaction_channel", "location_region", "browser_fingerprint",
+    ]
+
+    def __init__(self, contamination_rate: float = 0.03, compact: bool = False, n_jobs: int = 1,
+                 cache: Optional[FeatureCache] = None, covariance: str = "full", train_cpus=None,
+                 cascade: Optional[float] = None, fusion: str = "vote", importance_sample: Optional[int] = None,
+                 permutation_sample: Optional[int] = None, prune: Optional[float] = None,
+                 projection: Optional[str] = None, projection_dims: int = 16,
+                 weights: Optional[Dict[str, float]] = None, score_threads: Optional[int] = None,
+                 rules: Union[str, Dict, None] = None):
         self.contamination_rate = contamination_rate
+        # Compact mode: int8 flags, int32 counts, float32 values and model inputs
+        self.compact = compact
+        # Worker processes for feature engineering (-1: one per core)
+        self.n_jobs = n_jobs
+        # Parsed frames and features of files seen before, see load_features
+        self.cache = cache
+        # Elliptic layer fit: "full" MinCovDet on every row, or FastEllipticEnvelope's
+        # "subsample" / "welford" (covariance.py)
+        self.covariance = covariance
+        # Concurrent training: None fits the members one after another, each on
+        # every core; a dict of per-member CPU budgets (or "auto", see each
+        # detector's cpu_share) fits them at the same time within those budgets
+        self.train_cpus = train_cpus
+        # Cascade scoring: a small forest screens every row and only rows it
+        # can't clear reach the full forest; its cutoff keeps this share of the
+        # full forest's training anomalies, e.g. 0.99. None runs the full forest
+        # on every row.
+        self.cascade = cascade
+        # How predict combines the members: "vote" weighs each one's binary
+        # outlier call and flags at 0.4; "quantile" weighs their scores'
+        # calibrated ranks (calibration.py) and flags at thresholds["fused"]
+        self.fusion = fusion
+        # Rows sampled for the correlation feature importance; None reads every row
+        self.importance_sample = importance_sample
+        # Rows sampled for permutation importance, computed in a background
+        # process after training (see wait_permutation_importance); None skips it
+        self.permutation_sample = permutation_sample
+        # Feature pruning before training: drops constant and near-constant
+        # features and any feature whose rank correlation with a kept one
+        # exceeds this, e.g. 0.95 (selection.py); the models, scalers and
+        # scoring then use only the kept ones. None trains on every feature.
+        self.prune = prune
+        # Projection front end for the distance-based members: DBSCAN and the
+        # elliptic layer see their scaled matrix projected to projection_dims
+        # dimensions, by "pca" or sparse "random" projection (projection.py).
+        # None gives them every feature; the forest always does.
+        self.projection = projection
+        self.projection_dims = projection_dims
+        # Ensemble members and their weight in the fused score, votes or
+        # calibrated ranks: the detectors registered in detectors.py with
+        # their registered weights, overridden by `weights` (0 leaves one out)
+        self.weights = detector_weights(weights)
+        if "isolation_forest" not in self.weights:
+            raise ValueError("isolation_forest can't be left out: the cascade and feature importance are built on it")
+        # Threads predict scores the members on, sharing the scaled matrices;
+        # None: one per member, up to the number of cores
+        self.score_threads = score_threads
+        # Risk penalties and explanation reasons: a rule spec (rules.py), as a
+        # JSON file path or a dict; None reads the shipped risk_rules.json.
+        # Not part of the trained state, so rules change without retraining.
+        self.rules = RuleSet(rules) if isinstance(rules, dict) else RuleSet.load(rules or DEFAULT_RULES)
         self.models = {}
         self.scalers = {}
+        # Fitted projections of the dbscan and elliptic inputs, when projection is set
+        self.projections = {}
         self.feature_importance = {}
+        # Filled in when the background permutation importance job finishes
+        self.permutation_importance: Dict[str, float] = {}
+        self._permutation_job: Optional[Future] = None
+        self.feature_names = []
+        # Features pruning dropped, with the reason for each
+        self.dropped_features: Dict[str, str] = {}
         self.model_scores = None
+        # Fused scores of the last quantile-fusion predict, for fused_decision
+        self.last_fused_scores: Optional[np.ndarray] = None
         self.thresholds = {}
-
-    def load_and_preprocess(self, filepath: str) -> pd.DataFrame:
-        df = pd.read_csv(filepath)
-
-        column_mapping = {
-            "timestamp": "transaction_time",
-            "amount": "transaction_amount",
-            "card_present": "is_card_present"
-        }
-        df.rename(columns=column_mapping, inplace=True)
-
-        df["transaction_time"] = pd.to_datetime(df["transaction_time"], errors="coerce")
+        # Quantile tables of each member's training scores, and of the fused score
+        self.score_tables: Dict[str, np.ndarray] = {}
+        # Categories behind each *_encoded feature, fixed once the models are trained
+        self.vocabularies: Dict[str, np.ndarray] = {}
+
+    def required_features(self) -> Optional[List[str]]:
+        """Features the trained models, risk scoring and explanations read; None before training."""
+        if not self.feature_names:
+            return None
+        # amount and hour feed visualize_results
+        names = self.feature_names + self.rules.features + ["amount", "hour"]
+        return list(dict.fromkeys(names))
+
+    def load_and_preprocess(self, filepath: str, names: Optional[List[str]] = None) -> pd.DataFrame:
+        dtype = {col: "category" for col in self.CATEGORICAL_COLUMNS} if self.compact else None
+        df = pd.read_csv(filepath, usecols=self.csv_columns(names), dtype=dtype)
+        df = self.standardize(df)
         df = df.sort_values(["user_id", "transaction_time"]).reset_index(drop=True)
 
         initial_count = len(df)
@@ -54,223 +162,64 @@ class EliteFraudDetector:
 
         return df
 
-    def engineer_features(self, df: pd.DataFrame) -> pd.DataFrame:
-        print("Engineering features...")
-        features = pd.DataFrame(index=df.index)
-
-        # Transaction Amount Features
-        features["amount"] = df["transaction_amount"]
-        features["log_amount"] = np.log1p(df["transaction_amount"])
-        features["sqrt_amount"] = np.sqrt(df["transaction_amount"])
-        features["amount_squared"] = df["transaction_amount"] ** 2
-
-        features["amount_vs_user_median"] = df.groupby("user_id")["transaction_amount"].transform(
-            lambda x: (x - x.median()) / (x.std() + 1e-6)
-        )
-        features["amount_vs_user_max"] = df.groupby("user_id")["transaction_amount"].transform(
-            lambda x: x / (x.max() + 1e-6)
-        )
-
-        features["amount_zscore"] = (df["transaction_amount"] - df["transaction_amount"].mean()) / (df["transaction_amount"].std() + 1e-6)
-        features["amount_percentile"] = df["transaction_amount"].rank(pct=True)
-
-        # Temporal Features
-        features["hour"] = df["transaction_time"].dt.hour
-        features["day_of_week"] = df["transaction_time"].dt.dayofweek
-        features["day_of_month"] = df["transaction_time"].dt.day
-        features["month"] = df["transaction_time"].dt.month
-        features["is_weekend"] = (df["transaction_time"].dt.dayofweek >= 5).astype(int)
-        features["is_night"] = ((df["transaction_time"].dt.hour >= 23) | (df["transaction_time"].dt.hour <= 5)).astype(int)
-        features["is_business_hours"] = ((df["transaction_time"].dt.hour >= 9) & (df["transaction_time"].dt.hour <= 17)).astype(int)
-
-        features["hour_sin"] = np.sin(2 * np.pi * features["hour"] / 24)
-        features["hour_cos"] = np.cos(2 * np.pi * features["hour"] / 24)
-        features["day_sin"] = np.sin(2 * np.pi * features["day_of_week"] / 7)
-        features["day_cos"] = np.cos(2 * np.pi * features["day_of_week"] / 7)
-
-        # Velocity Features
-        df_temp = df.copy()
-        df_temp = df_temp.set_index("transaction_time")
-
-        for window in ["1min", "5min", "15min", "1H", "6H", "24H"]:
-            features[f"txn_count_{window}"] = (
-                df_temp.groupby("user_id")["transaction_amount"]
-                .rolling(window, min_periods=1)
-                .count()
-                .reset_index(level=0, drop=True)
-                .reindex(df.index)
-                .fillna(1)
-            )
-            features[f"amount_sum_{window}"] = (
-                df_temp.groupby("user_id")["transaction_amount"]
-                .rolling(window, min_periods=1)
-                .sum()
-                .reset_index(level=0, drop=True)
-                .reindex(df.index)
-                .fillna(0)
-            )
-
-        df_temp = df_temp.reset_index()
-
-        df["time_since_last"] = df.groupby("user_id")["transaction_time"].diff().dt.total_seconds().fillna(86400)
-        features["seconds_since_last_txn"] = df["time_since_last"]
-        features["log_time_since_last"] = np.log1p(df["time_since_last"])
-
-        features["avg_txn_interval"] = df.groupby("user_id")["time_since_last"].transform("mean")
-        features["time_deviation_from_pattern"] = (features["seconds_since_last_txn"] - features["avg_txn_interval"]) / (features["avg_txn_interval"] + 1e-6)
-
-        # User Behavior Profiling
-        features["user_txn_count"] = df.groupby("user_id").cumcount() + 1
-        features["is_first_transaction"] = (features["user_txn_count"] == 1).astype(int)
-
-        features["user_avg_amount"] = df.groupby("user_id")["transaction_amount"].transform("mean")
-        features["user_std_amount"] = df.groupby("user_id")["transaction_amount"].transform("std").fillna(0)
-        features["user_max_amount"] = df.groupby("user_id")["transaction_amount"].transform("max")
-        features["user_min_amount"] = df.groupby("user_id")["transaction_amount"].transform("min")
-
-        features["amount_deviation_from_user"] = (
-            (df["transaction_amount"] - features["user_avg_amount"]) / (features["user_std_amount"] + 1e-6)
-        )
-
-        # Merchant & Category Features
-        if "merchant_category" in df.columns:
-            merchant_counts = df["merchant_category"].value_counts()
-            features["merchant_category_freq"] = df["merchant_category"].map(merchant_counts)
-            features["merchant_category_freq_normalized"] = features["merchant_category_freq"] / len(df)
-
-            features["user_category_count"] = df.groupby(["user_id", "merchant_category"]).cumcount() + 1
-            features["is_new_category_for_user"] = (features["user_category_count"] == 1).astype(int)
-            features["merchant_category_encoded"] = pd.Categorical(df["merchant_category"]).codes
-
-        if "merchant_id" in df.columns:
-            merchant_id_counts = df["merchant_id"].value_counts()
-            features["merchant_id_freq"] = df["merchant_id"].map(merchant_id_counts)
-            features["is_rare_merchant"] = (features["merchant_id_freq"] < 10).astype(int)
-
-            features["user_merchant_count"] = df.groupby(["user_id", "merchant_id"]).cumcount() + 1
-            features["is_new_merchant_for_user"] = (features["user_merchant_count"] == 1).astype(int)
-
-        # Geographic Features
-        if "country" in df.columns:
-            country_counts = df["country"].value_counts()
-            features["country_freq"] = df["country"].map(country_counts)
-            features["is_rare_country"] = (features["country_freq"] < 50).astype(int)
-            features["country_encoded"] = pd.Categorical(df["country"]).codes
-
-            features["user_country_count"] = df.groupby(["user_id", "country"]).cumcount() + 1
-            features["is_new_country_for_user"] = (features["user_country_count"] == 1).astype(int)
-
-        if "location_region" in df.columns:
-            features["location_region_encoded"] = pd.Categorical(df["location_region"]).codes
-
-        if {"latitude", "longitude"}.issubset(df.columns):
-            df["lat_shift"] = df.groupby("user_id")["latitude"].shift(1)
-            df["lon_shift"] = df.groupby("user_id")["longitude"].shift(1)
-
-            features["geo_distance_km"] = self._haversine_distance(
-                df["latitude"], df["longitude"],
-                df["lat_shift"], df["lon_shift"]
-            )
-            features["geo_distance_km"].fillna(0, inplace=True)
-
-            time_hours = df["time_since_last"] / 3600
-            features["implied_speed_kmh"] = features["geo_distance_km"] / (time_hours + 1e-6)
-            features["is_impossible_travel"] = (features["implied_speed_kmh"] > 900).astype(int)
-
-            features["lat_std"] = df.groupby("user_id")["latitude"].transform("std").fillna(0)
-            features["lon_std"] = df.groupby("user_id")["longitude"].transform("std").fillna(0)
-            features["geo_entropy"] = np.sqrt(features["lat_std"]**2 + features["lon_std"]**2)
-
-        # Device & Session Features
-        if "device_id" in df.columns:
-            device_counts = df["device_id"].value_counts()
-            features["device_freq"] = df["device_id"].map(device_counts)
-            features["is_rare_device"] = (features["device_freq"] < 5).astype(int)
-
-            features["device_change"] = (
-                df.groupby("user_id")["device_id"].transform(lambda x: ~x.duplicated())
-            ).astype(int)
-            features["user_device_count"] = df.groupby("user_id")["device_id"].transform("nunique")
-            features["is_multi_device_user"] = (features["user_device_count"] > 3).astype(int)
-
-        if "browser_fingerprint" in df.columns:
-            features["browser_change"] = (
-                df.groupby("user_id")["browser_fingerprint"].transform(lambda x: ~x.duplicated())
-            ).astype(int)
-
-        # IP Address Features
-        if "ip_address" in df.columns:
-            features["ip_entropy"] = df["ip_address"].astype(str).apply(lambda x: len(set(x)))
-
-            ip_counts = df["ip_address"].value_counts()
-            features["ip_freq"] = df["ip_address"].map(ip_counts)
-            features["is_rare_ip"] = (features["ip_freq"] < 5).astype(int)
-
-            features["user_ip_count"] = df.groupby("user_id")["ip_address"].transform("nunique")
-            features["is_new_ip_for_user"] = (
-                df.groupby("user_id")["ip_address"].transform(lambda x: ~x.duplicated())
-            ).astype(int)
-
-            features["users_per_ip"] = df.groupby("ip_address")["user_id"].transform("nunique")
-            features["is_shared_ip"] = (features["users_per_ip"] > 5).astype(int)
-
-        # Security Indicators
-        if "failed_login_attempts" in df.columns:
-            features["failed_login_attempts"] = df["failed_login_attempts"].fillna(0)
-            features["has_failed_logins"] = (features["failed_login_attempts"] > 0).astype(int)
-            features["high_failed_logins"] = (features["failed_login_attempts"] >= 3).astype(int)
-        else:
-            features["failed_login_attempts"] = 0
-            features["has_failed_logins"] = 0
-            features["high_failed_logins"] = 0
-
-        if "profile_updated" in df.columns:
-            features["profile_updated"] = df["profile_updated"].fillna(0).astype(int)
-        else:
-            features["profile_updated"] = 0
-
-        if "is_new_payee" in df.columns:
-            features["is_new_payee"] = df["is_new_payee"].fillna(0).astype(int)
-        else:
-            features["is_new_payee"] = 0
+    def load_features(self, filepath: str,
+                      names: Optional[List[str]] = None) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        """load_and_preprocess + engineer_features, skipped entirely when the cache has seen this file."""
+        if self.cache is None:
+            df = self.load_and_preprocess(filepath, names)
+            return df, self.engineer_features(df, names=names)
+
+        key = self.cache.key(filepath, names, self.compact, self.vocabularies if self.feature_names else None)
+        cached = self.cache.get(key)
+        if cached is not None:
+            df, features = cached
+            if not self.feature_names:
+                self.vocabularies = category_vocabularies(df)
+            print(f"Loaded {len(df):,} transactions and {len(features.columns)} features from cache")
+            return df, features
+
+        df = self.load_and_preprocess(filepath, names)
+        features = self.engineer_features(df, names=names)
+        self.cache.put(key, df, features)
+        return df, features
+
+    def csv_columns(self, names: Optional[List[str]] = None):
+        """usecols for read_csv: the CSV columns `names` need, or all of them when None."""
+        if names is None:
+            return None
+        needed = required_columns(names) | {"transaction_id"}
+        needed |= {raw for raw, mapped in self.COLUMN_MAPPING.items() if mapped in needed}
+        if needed & set(IP_KEY_COLUMNS):
+            needed.add("ip_address")
+        return needed.__contains__
+
+    def standardize(self, df: pd.DataFrame) -> pd.DataFrame:
+        df.rename(columns=self.COLUMN_MAPPING, inplace=True)
+        df["transaction_time"] = pd.to_datetime(df["transaction_time"], errors="coerce")
+        # IPs are parsed once here; IP features work on the integer keys
+        return add_ip_keys(df)
 
-        # Transaction Channel & Card Features
-        if "transaction_channel" in df.columns:
-            features["channel_encoded"] = pd.Categorical(df["transaction_channel"]).codes
-            channel_counts = df["transaction_channel"].value_counts()
-            features["channel_freq"] = df["transaction_channel"].map(channel_counts)
+    def engineer_features(self, df: pd.DataFrame,
+                          state: Optional[UserFeatureStore] = None,
+                          names: Optional[List[str]] = None,
+                          global_stats: Optional[GlobalStats] = None) -> pd.DataFrame:
+        print("Engineering features...")
 
-        if "is_card_present" in df.columns:
-            features["card_not_present"] = (df["is_card_present"] == 0).astype(int)
+        # Only the requested features (all by default) and their dependencies
+        # are computed; see features.py for the registry. Per-user primitives
+        # come from the batch alone, or from the batch folded into `state`;
+        # cross-user features come from the batch or from whole-file `global_stats`.
+        # With n_jobs, a plain batch is split by user across worker processes.
+        # Until training, category codes follow this batch (or `global_stats`); after
+        # it, the vocabularies the models were trained on.
+        if not self.feature_names:
+            self.vocabularies = category_vocabularies(df, global_stats)
+        if self.n_jobs != 1 and state is None and global_stats is None:
+            features = parallel_features(df, names, self.n_jobs, compact=self.compact,
+                                         vocabularies=self.vocabularies)
         else:
-            features["card_not_present"] = 0
-
-        if "currency" in df.columns:
-            features["currency_encoded"] = pd.Categorical(df["currency"]).codes
-            if "country" in df.columns:
-                features["is_foreign_currency"] = (
-                    df["currency"].astype(str) != df["country"].astype(str)
-                ).astype(int)
-
-        # Network Analysis Features
-        if "device_id" in df.columns:
-            features["device_user_network_size"] = df.groupby("device_id")["user_id"].transform("nunique")
-            features["is_device_shared"] = (features["device_user_network_size"] > 3).astype(int)
-
-        if "ip_address" in df.columns and "device_id" in df.columns:
-            df["ip_device_pair"] = df["ip_address"].astype(str) + "_" + df["device_id"].astype(str)
-            pair_counts = df["ip_device_pair"].value_counts()
-            features["ip_device_pair_freq"] = df["ip_device_pair"].map(pair_counts)
-
-        # Statistical Aggregations
-        for col in ["transaction_amount"]:
-            if col in df.columns:
-                features[f"rolling_mean_10"] = df.groupby("user_id")[col].transform(
-                    lambda x: x.rolling(window=10, min_periods=1).mean()
-                )
-                features[f"rolling_std_10"] = df.groupby("user_id")[col].transform(
-                    lambda x: x.rolling(window=10, min_periods=1).std()
-                ).fillna(0)
+            features = compute_features(df, names, state, compact=self.compact, stats=global_stats,
+                                        vocabularies=self.vocabularies)
 
         features.fillna(0, inplace=True)
         features.replace([np.inf, -np.inf], 0, inplace=True)
@@ -278,180 +227,341 @@ class EliteFraudDetector:
         print(f"Generated {len(features.columns)} features")
         return features
 
-    def _haversine_distance(self, lat1, lon1, lat2, lon2):
-        R = 6371
-        lat1, lon1, lat2, lon2 = map(np.radians, [lat1, lon1, lat2, lon2])
-        dlat = lat2 - lat1
-        dlon = lon2 - lon1
-        a = np.sin(dlat/2)**2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlon/2)**2
-        c = 2 * np.arcsin(np.sqrt(a))
-        return R * c
-
     def train_ensemble(self, features: pd.DataFrame) -> None:
         print("Training ensemble models...")
+        self.feature_names = list(features.columns)
+        if self.prune is not None:
+            self.feature_names, self.dropped_features = select_features(
+                features, max_corr=self.prune, near_constant=self.NEAR_CONSTANT_SHARE
+            )
+            features = features[self.feature_names]
+            print(f"Pruned {len(self.dropped_features)} features, training on {len(self.feature_names)}")
+        X = self._model_input(features)
 
         self.scalers["robust"] = RobustScaler()
-        X_robust = self.scalers["robust"].fit_transform(features)
-
         self.scalers["standard"] = StandardScaler()
-        X_standard = self.scalers["standard"].fit_transform(features)
+        scaled = {name: scaler.fit_transform(X) for name, scaler in self.scalers.items()}
+        X_robust, X_standard = scaled["robust"], scaled["standard"]
+
+        if self.projection is not None:
+            dims = min(self.projection_dims, X.shape[1])
+            self.projections = {
+                name: make_projection(self.projection, dims, random_state=42).fit(scaled[DETECTORS[name].scaling])
+                for name in self.weights if DETECTORS[name].distance_based
+            }
+        inputs = {name: self._member_input(name, scaled) for name in self.weights}
+
+        budget = self._train_budget()
+        self.models = {name: DETECTORS[name].factory(self, budget[name] if budget else -1) for name in self.weights}
+
+        # Continuous training scores, lower is more abnormal
+        self.model_scores = self._fit_members(
+            {name: lambda name=name: self.models[name].fit(inputs[name]).score_batch(inputs[name])
+             for name in self.weights},
+            budget
+        )
+        if_scores = self.model_scores["isolation_forest"]
+
+        if self.cascade is not None:
+            self._fit_cascade(X_robust, if_scores < self.models["isolation_forest"].threshold_)
+        self._fit_score_tables()
+
+        self.feature_importance = correlation_importance(X_standard, if_scores, self.feature_names,
+                                                         self.importance_sample)
+        if self.permutation_sample is not None:
+            self._start_permutation_importance(X_robust)
+        print("Ensemble training complete")
 
-        # Isolation Forest
-        self.models["isolation_forest"] = IsolationForest(
-            n_estimators=300,
-            contamination=self.contamination_rate,
+    def _fit_cascade(self, X_robust: np.ndarray, flagged: np.ndarray) -> None:
+        """The cascade's first stage, with a cutoff that keeps `cascade` of the forest's flagged training rows."""
+        # Same seed, so its trees are the full forest's first CASCADE_TREES
+        self.models["cascade"] = IsolationForest(
+            n_estimators=self.CASCADE_TREES,
             max_samples='auto',
             max_features=1.0,
             bootstrap=True,
             random_state=42,
             n_jobs=-1
-        )
-        if_scores = self.models["isolation_forest"].fit(X_robust).score_samples(X_robust)
-
-        # DBSCAN
-        self.models["dbscan"] = DBSCAN(
-            eps=3.0,
-            min_samples=10,
-            n_jobs=-1
-        )
-        dbscan_labels = self.models["dbscan"].fit_predict(X_standard)
+        ).fit(X_robust)
+        scores = self.model_scores["cascade"] = self.models["cascade"].score_samples(X_robust)
+        cutoff = np.quantile(scores[flagged], self.cascade) if flagged.any() else np.inf
+        self.thresholds["cascade"] = float(cutoff)
+        passed = scores <= cutoff
+        print(f"Cascade: first stage passes {passed.mean():.1%} of training rows, "
+              f"{passed[flagged].mean() if flagged.any() else 1:.1%} of forest anomalies")
+
+    def _fit_score_tables(self) -> None:
+        """Quantile tables of the training scores, and the fused-score cutoff that flags contamination_rate."""
+        self.score_tables = {name: quantile_table(scores) for name, scores in self.model_scores.items()}
+        fused = sum(weight * outlier_rank(self.score_tables[name], self.model_scores[name])
+                    for name, weight in self.weights.items())
+        self.score_tables["fused"] = quantile_table(fused)
+        self.set_alert_rate(self.contamination_rate)
+
+    def set_alert_rate(self, rate: float) -> float:
+        """
+        Flag the top `rate` of fused scores, as measured on the training data,
+        and return the cutoff. Takes effect on the next predict; rows already
+        scored are decided again without rescoring by
+        fused_decision(last_fused_scores).
+        """
+        self.thresholds["fused"] = table_quantile(self.score_tables["fused"], 1 - rate)
+        return self.thresholds["fused"]
+
+    def _train_budget(self) -> Optional[Dict[str, int]]:
+        if self.train_cpus is None:
+            return None
+        if self.train_cpus == "auto":
+            cores = os.cpu_count() or 1
+            return {name: max(1, int(cores * DETECTORS[name].cpu_share)) for name in self.weights}
+        return {name: self.train_cpus.get(name, 1) for name in self.weights}
+
+    @staticmethod
+    def _fit_members(fits: Dict, budget: Optional[Dict[str, int]]) -> Dict:
+        """Run each member's fit, one after another or, with a budget, in threads sharing the scaled matrices."""
+        def timed(name, fit):
+            start = time.perf_counter()
+            result = fit()
+            print(f"  {name}: {time.perf_counter() - start:.1f}s")
+            return result
+
+        if budget is None:
+            return {name: timed(name, fit) for name, fit in fits.items()}
+        # The fits release the GIL in their native loops. The elliptic fit's
+        # only parallelism is BLAS, whose thread limit is process-wide; the
+        # other two members barely use BLAS, so it is set to the elliptic budget.
+        with threadpool_limits(limits=budget.get("elliptic", 1), user_api="blas"), \
+                ThreadPoolExecutor(max_workers=len(fits)) as pool:
+            futures = {name: pool.submit(timed, name, fit) for name, fit in fits.items()}
+            return {name: future.result() for name, future in futures.items()}
+
+    def _model_input(self, features: pd.DataFrame):
+        if self.compact:
+            return features.to_numpy(dtype=np.float32)
+        return features
 
-        # Elliptic Envelope
-        self.models["elliptic"] = EllipticEnvelope(
-            contamination=self.contamination_rate,
-            random_state=42
+    def _start_permutation_importance(self, X_robust: np.ndarray) -> None:
+        """Permutation importance of the forest's scores on a sample, in one worker process so scoring isn't held up."""
+        rows = np.arange(len(X_robust))
+        if len(rows) > self.permutation_sample:
+            rows = np.sort(np.random.default_rng(42).choice(len(rows), self.permutation_sample, replace=False))
+        pool = ProcessPoolExecutor(max_workers=1)
+        self.permutation_importance = {}
+        self._permutation_job = pool.submit(
+            permutation_importance, self.models["isolation_forest"].model, X_robust[rows], self.feature_names
         )
-        ee_scores = self.models["elliptic"].fit(X_robust).score_samples(X_robust)
-
-        self.model_scores = {
-            "isolation_forest": if_scores,
-            "dbscan": (dbscan_labels == -1).astype(int),
-            "elliptic": ee_scores
-        }
-
-        self.feature_importance = self._calculate_feature_importance(features, if_scores)
-        print("Ensemble training complete")
-
-    def _calculate_feature_importance(self, features: pd.DataFrame, anomaly_scores: np.ndarray) -> Dict:
-        importance = {}
-        for col in features.columns:
-            corr = np.corrcoef(features[col], anomaly_scores)[0, 1]
-            importance[col] = abs(corr) if not np.isnan(corr) else 0
-        return dict(sorted(importance.items(), key=lambda x: x[1], reverse=True))
-
-    def predict(self, features: pd.DataFrame) -> Tuple[np.ndarray, np.ndarray]:
+        self._permutation_job.add_done_callback(self._permutation_done)
+        # The worker exits once the job is done
+        pool.shutdown(wait=False)
+
+    def _permutation_done(self, job: Future) -> None:
+        if job is not self._permutation_job:
+            return
+        self._permutation_job = None
+        if job.exception() is not None:
+            print(f"Permutation importance failed: {job.exception()!r}")
+        else:
+            self.permutation_importance = job.result()
+
+    def wait_permutation_importance(self, timeout: Optional[float] = None) -> Dict[str, float]:
+        """
+        Block until the background permutation importance job finishes (or
+        timeout seconds pass) and return it; empty if the job failed.
+        """
+        job = self._permutation_job
+        if job is not None:
+            job.exception(timeout)
+            self._permutation_done(job)
+        return self.permutation_importance
+
+    # Everything predict, risk scoring, explanations and the report need from training
+    TRAINED_STATE = ["contamination_rate", "compact", "feature_names", "scalers", "models", "thresholds",
+                     "score_tables", "fusion", "vocabularies", "feature_importance", "permutation_importance",
+                     "dropped_features", "projections", "weights"]
+
+    def save(self, path: str) -> None:
+        """
+        Write the trained scalers, models, thresholds, vocabularies and feature
+        list to the directory `path`, after waiting for a background
+        permutation importance job so the artifact holds its result.
+        """
+        if not self.feature_names:
+            raise ValueError("Train the detector before saving it")
+        self.wait_permutation_importance()
+        state = {name: getattr(self, name) for name in self.TRAINED_STATE}
+        write_artifact(path, state, {"feature_names": self.feature_names})
+        print(f"Saved trained detector to {path}")
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True, **kwargs) -> "EliteFraudDetector":
+        """
+        A detector ready to predict from an artifact written by save(). With
+        mmap, large arrays are mapped from the artifact's files instead of
+        read, so worker processes share their pages. kwargs go to the
+        constructor (n_jobs, cache).
+        """
+        detector = cls(**kwargs)
+        for name, value in read_artifact(path, mmap).items():
+            setattr(detector, name, value)
+        return detector
+
+    def predict(self, features: pd.DataFrame, cascade: bool = True) -> Tuple[np.ndarray, np.ndarray]:
+        """Anomaly flags and ensemble confidence; through the cascade when one was trained, unless cascade=False."""
         print("Generating predictions...")
-
-        X_robust = self.scalers["robust"].transform(features)
-        X_standard = self.scalers["standard"].transform(features)
-
-        if_pred = self.models["isolation_forest"].predict(X_robust)
-        dbscan_pred = self.models["dbscan"].fit_predict(X_standard)
-        ee_pred = self.models["elliptic"].predict(X_robust)
-
-        ensemble_score = (
-            0.5 * (if_pred == -1).astype(int) +
-            0.3 * (dbscan_pred == -1).astype(int) +
-            0.2 * (ee_pred == -1).astype(int)
-        )
-
-        is_anomaly = (ensemble_score >= 0.4).astype(int)
+        scaled = self._scaled(features)
+
+        if self.fusion == "quantile":
+            ranks = self._score_members(scaled, lambda name, X: (
+                self._forest_ranks(X, cascade) if name == "isolation_forest"
+                else outlier_rank(self.score_tables[name], self.models[name].score_batch(X))
+            ))
+            self.last_fused_scores = sum(weight * ranks[name] for name, weight in self.weights.items())
+            return self.fused_decision(self.last_fused_scores)
+
+        votes = self._score_members(scaled, lambda name, X: (
+            self._forest_outliers(X, cascade) if name == "isolation_forest" else self.models[name].is_outlier(X)
+        ))
+        ensemble_score = sum(weight * votes[name].astype(int) for name, weight in self.weights.items())
+
+        is_anomaly = (ensemble_score >= self.VOTE_CUTOFF).astype(int)
         confidence = ensemble_score
 
         return is_anomaly, confidence
 
+    def fused_decision(self, fused_scores: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Anomaly flags and confidence of quantile-fusion scores under the
+        current thresholds["fused"]. The confidence is on the vote scale, so
+        the risk base and bands mean the same in both fusion modes: 0 below
+        the cutoff, and from VOTE_CUTOFF at it up to 1 at the highest possible
+        fused score. A typical row ranks around 0.5, which must not count.
+        """
+        cutoff = self.thresholds["fused"]
+        flagged = fused_scores >= cutoff
+        top = sum(self.weights.values())
+        above = np.clip((fused_scores - cutoff) / max(top - cutoff, 1e-12), 0, 1)
+        confidence = np.where(flagged, self.VOTE_CUTOFF + (1 - self.VOTE_CUTOFF) * above, 0.0)
+        return flagged.astype(int), confidence
+
+    def _score_members(self, scaled: Dict[str, np.ndarray], score: Callable) -> Dict[str, np.ndarray]:
+        """score(name, X) for each member on its input, in threads that share the scaled matrices."""
+        threads = self.score_threads or min(len(self.weights), os.cpu_count() or 1)
+        if threads == 1:
+            return {name: score(name, self._member_input(name, scaled)) for name in self.weights}
+        # The members' scoring loops are native code that releases the GIL
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            futures = {name: pool.submit(lambda name=name: score(name, self._member_input(name, scaled)))
+                       for name in self.weights}
+            return {name: future.result() for name, future in futures.items()}
+
+    def _forest_outliers(self, X_robust: np.ndarray, cascade: bool) -> np.ndarray:
+        """The forest's votes; with the cascade, rows the first stage clears are inliers without reaching it."""
+        forest = self.models["isolation_forest"]
+        if not (cascade and "cascade" in self.models):
+            return forest.is_outlier(X_robust)
+        outliers = np.zeros(len(X_robust), dtype=bool)
+        candidates = self._cascade_candidates(X_robust)
+        if candidates.any():
+            outliers[candidates] = forest.is_outlier(X_robust[candidates])
+        return outliers
+
+    def _forest_ranks(self, X_robust: np.ndarray, cascade: bool) -> np.ndarray:
+        """The forest's calibrated ranks; with the cascade, rows the first stage clears keep its own rank."""
+        forest = self.models["isolation_forest"]
+        if not (cascade and "cascade" in self.models):
+            return outlier_rank(self.score_tables["isolation_forest"], forest.score_batch(X_robust))
+        first_stage = self.models["cascade"].score_samples(X_robust)
+        ranks = outlier_rank(self.score_tables["cascade"], first_stage)
+        candidates = first_stage <= self.thresholds["cascade"]
+        if candidates.any():
+            ranks[candidates] = outlier_rank(self.score_tables["isolation_forest"],
+                                             forest.score_batch(X_robust[candidates]))
+        return ranks
+
+    def _scaled(self, features: pd.DataFrame) -> Dict[str, np.ndarray]:
+        """The scaled matrices the forest and the other members read."""
+        X = self._model_input(features[self.feature_names])
+        needed = {"robust"} | {DETECTORS[name].scaling for name in self.weights}
+        return {name: scaler.transform(X) for name, scaler in self.scalers.items() if name in needed}
+
+    def _member_input(self, member: str, scaled: Dict[str, np.ndarray]) -> np.ndarray:
+        """A member's scaled matrix, through its fitted projection if there is one."""
+        X = scaled[DETECTORS[member].scaling]
+        if member in self.projections:
+            return self.projections[member].transform(X)
+        return X
+
+    def _cascade_candidates(self, X_robust: np.ndarray) -> np.ndarray:
+        """Rows the first stage can't clear; only these reach the full forest."""
+        return self.models["cascade"].score_samples(X_robust) <= self.thresholds["cascade"]
+
+    def cascade_report(self, features: pd.DataFrame) -> Dict[str, float]:
+        """Recall, pass rate and speed of the cascade against the full ensemble on `features`."""
+        start = time.perf_counter()
+        full, _ = self.predict(features, cascade=False)
+        full_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        cascaded, _ = self.predict(features)
+        cascade_seconds = time.perf_counter() - start
+        return {
+            "recall": float(cascaded[full == 1].mean()) if full.any() else 1.0,
+            "passed": float(self._cascade_candidates(self._scaled(features)["robust"]).mean()),
+            "full_seconds": full_seconds,
+            "cascade_seconds": cascade_seconds,
+        }
+
     def calculate_risk_score(self, df: pd.DataFrame, features: pd.DataFrame,
                             is_anomaly: np.ndarray, confidence: np.ndarray) -> pd.Series:
         print("Calculating risk scores...")
 
-        risk_scores = confidence * 50
-
-        if "txn_count_5min" in features.columns:
-            risk_scores += np.minimum(features["txn_count_5min"] * 2, 10)
-        if "amount_deviation_from_user" in features.columns:
-            risk_scores += np.minimum(np.abs(features["amount_deviation_from_user"]) * 2, 10)
-        if "failed_login_attempts" in features.columns:
-            risk_scores += np.minimum(features["failed_login_attempts"] * 3, 10)
-        if "is_impossible_travel" in features.columns:
-            risk_scores += features["is_impossible_travel"] * 10
-
-        new_entity_risk = 0
-        if "is_new_payee" in features.columns:
-            new_entity_risk += features["is_new_payee"] * 3
-        if "is_new_country_for_user" in features.columns:
-            new_entity_risk += features["is_new_country_for_user"] * 3
-        if "device_change" in features.columns:
-            new_entity_risk += features["device_change"] * 4
-        risk_scores += np.minimum(new_entity_risk, 10)
-
+        # Base: model confidence (0-50), plus the spec's penalties in one fused pass
+        risk_scores = self.rules.add_penalties(confidence * 50, features)
         return pd.Series(np.clip(risk_scores, 0, 100), index=df.index)
 
     def generate_explanations(self, df: pd.DataFrame, features: pd.DataFrame,
-                             is_anomaly: np.ndarray, risk_scores: pd.Series) -> pd.Series:
+                             is_anomaly: np.ndarray, risk_scores: pd.Series,
+                             log_amount_cutoff: Optional[float] = None) -> pd.Series:
         print("Generating explanations...")
 
-        explanations = pd.Series(["Normal transaction"] * len(df), index=df.index)
-
-        for idx in df[is_anomaly == 1].index:
-            reasons = []
-            risk = risk_scores.iloc[idx]
-
-            if "is_impossible_travel" in features.columns and features.loc[idx, "is_impossible_travel"] == 1:
-                reasons.append("Impossible travel detected")
-            if "high_failed_logins" in features.columns and features.loc[idx, "high_failed_logins"] == 1:
-                reasons.append("Multiple failed login attempts")
-            if "log_amount" in features.columns and features.loc[idx, "log_amount"] > features["log_amount"].quantile(0.99):
-                reasons.append("Unusually high amount (top 1%)")
-            if "amount_deviation_from_user" in features.columns and abs(features.loc[idx, "amount_deviation_from_user"]) > 3:
-                reasons.append(f"Amount {abs(features.loc[idx, 'amount_deviation_from_user']):.1f}σ from user pattern")
-            if "txn_count_5min" in features.columns and features.loc[idx, "txn_count_5min"] > 3:
-                reasons.append(f"Rapid transactions ({int(features.loc[idx, 'txn_count_5min'])} in 5min)")
-            if "is_new_country_for_user" in features.columns and features.loc[idx, "is_new_country_for_user"] == 1:
-                reasons.append("First transaction in this country")
-            if "geo_distance_km" in features.columns and features.loc[idx, "geo_distance_km"] > 500:
-                reasons.append(f"Large location change ({features.loc[idx, 'geo_distance_km']:.0f}km)")
-            if "device_change" in features.columns and features.loc[idx, "device_change"] == 1:
-                reasons.append("New device detected")
-            if "is_new_ip_for_user" in features.columns and features.loc[idx, "is_new_ip_for_user"] == 1:
-                reasons.append("New IP address")
-            if "is_new_payee" in features.columns and features.loc[idx, "is_new_payee"] == 1:
-                reasons.append("New payee/merchant")
-            if "is_new_merchant_for_user" in features.columns and features.loc[idx, "is_new_merchant_for_user"] == 1:
-                reasons.append("First transaction with merchant")
-            if "card_not_present" in features.columns and features.loc[idx, "card_not_present"] == 1:
-                reasons.append("Card-not-present transaction")
-            if "is_night" in features.columns and features.loc[idx, "is_night"] == 1:
-                reasons.append("Transaction during unusual hours")
-            if "is_device_shared" in features.columns and features.loc[idx, "is_device_shared"] == 1:
-                reasons.append("Device shared across multiple users")
-            if "is_first_transaction" in features.columns and features.loc[idx, "is_first_transaction"] == 1:
-                reasons.append("First transaction ever")
-
-            if reasons:
-                explanation = " | ".join(reasons[:5])
-                explanations.iloc[idx] = f"[RISK: {risk:.0f}/100] {explanation}"
-            else:
-                explanations.iloc[idx] = f"[RISK: {risk:.0f}/100] Statistical anomaly detected"
-
-        return explanations
+        # Top 1% of this frame, unless the caller knows the whole dataset's
+        if log_amount_cutoff is None and "log_amount" in features.columns:
+            log_amount_cutoff = features["log_amount"].quantile(0.99)
+
+        # The spec's reasons are tested in one fused pass over the flagged rows,
+        # packed into a bitmask per row, and only those rows are rendered as text
+        rows = np.flatnonzero(np.asarray(is_anomaly) == 1)
+        explanations = np.empty(len(df), dtype=object)
+        explanations.fill("Normal transaction")
+        explanations[rows] = self.rules.explain(features, rows, risk_scores.to_numpy()[rows],
+                                                {"log_amount_cutoff": log_amount_cutoff})
+        return pd.Series(explanations, index=df.index)
 
     def generate_report(self, df: pd.DataFrame, is_anomaly: np.ndarray,
                        risk_scores: pd.Series) -> Dict:
+        return self.format_report(self.report_counts(is_anomaly, risk_scores))
+
+    def report_counts(self, is_anomaly: np.ndarray, risk_scores: pd.Series) -> RiskHistogram:
+        """The report's totals in one histogram pass; batches merge before formatting (global_stats.py)."""
+        return RiskHistogram.of(is_anomaly, risk_scores)
+
+    def format_report(self, counts: RiskHistogram) -> Dict:
+        total = counts.n
+        bands = counts.bands()
         report = {
             "summary": {
-                "total_transactions": len(df),
-                "flagged_transactions": int(is_anomaly.sum()),
-                "flagged_percentage": f"{100 * is_anomaly.sum() / len(df):.2f}%",
-                "average_risk_score": f"{risk_scores.mean():.2f}",
-                "high_risk_count": int((risk_scores >= 70).sum()),
-                "medium_risk_count": int(((risk_scores >= 40) & (risk_scores < 70)).sum()),
-                "low_risk_count": int((risk_scores < 40).sum()),
+                "total_transactions": total,
+                "flagged_transactions": counts.flagged,
+                "flagged_percentage": f"{100 * counts.flagged / total:.2f}%",
+                "average_risk_score": f"{counts.risk_sum / total:.2f}",
+                "high_risk_count": bands["critical"] + bands["high"],
+                "medium_risk_count": bands["medium"],
+                "low_risk_count": bands["low"],
             },
             "risk_distribution": {
-                "critical (90-100)": int((risk_scores >= 90).sum()),
-                "high (70-89)": int(((risk_scores >= 70) & (risk_scores < 90)).sum()),
-                "medium (40-69)": int(((risk_scores >= 40) & (risk_scores < 70)).sum()),
-                "low (0-39)": int((risk_scores < 40).sum()),
+                "critical (90-100)": bands["critical"],
+                "high (70-89)": bands["high"],
+                "medium (40-69)": bands["medium"],
+                "low (0-39)": bands["low"],
             },
             "top_risk_factors": list(self.feature_importance.keys())[:15],
             "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
@@ -535,44 +645,72 @@ class EliteFraudDetector:
         print("Saved visualization: fraud_detection_analysis.png")
         plt.show()
 
+    def run_chunked(self, filepath: str, output_file: str = "fraud_detection_results.csv",
+                    memory_budget_mb: int = 2048) -> Dict:
+        """Score a file larger than memory shard by shard (see chunked.py); returns the report."""
+        return ChunkedPipeline(self, memory_budget_mb).run(filepath, output_file)
+
     def export_results(self, df: pd.DataFrame, is_anomaly: np.ndarray,
                       risk_scores: pd.Series, explanations: pd.Series,
                       report: Dict, output_file: str = "fraud_detection_results.csv") -> None:
         print(f"Exporting results to {output_file}...")
 
-        results_df = df.copy()
-        results_df["is_anomaly"] = is_anomaly
-        results_df["risk_score"] = risk_scores
-        results_df["risk_category"] = pd.cut(
-            risk_scores,
-            bins=[0, 40, 70, 90, 100],
-            labels=["Low", "Medium", "High", "Critical"]
-        )
-        results_df["explanation"] = explanations
-        results_df["model_confidence"] = risk_scores / 100
+        # One pass writes the full results and the HIGH_RISK subset, in the
+        # format output_file's suffix names (export.py)
+        with ResultWriter(output_file) as writer:
+            writer.write(self.results_frame(df, is_anomaly, risk_scores, explanations))
+        print(f"Saved {writer.rows['all']} transactions to {output_file}")
 
-        results_df = results_df.sort_values("risk_score", ascending=False)
-        results_df.to_csv(output_file, index=False)
-        print(f"Saved {len(results_df)} transactions to {output_file}")
-
-        report_file = output_file.replace(".csv", "_report.json")
+        report_file = sibling_path(output_file, "_report", ".json")
         with open(report_file, "w") as f:
             json.dump(report, f, indent=2)
         print(f"Saved analysis report to {report_file}")
 
-        high_risk_df = results_df[results_df["risk_score"] >= 70]
-        if len(high_risk_df) > 0:
-            high_risk_file = output_file.replace(".csv", "_HIGH_RISK.csv")
-            high_risk_df.to_csv(high_risk_file, index=False)
-            print(f"Saved {len(high_risk_df)} HIGH-RISK transactions to {high_risk_file}")
+        if writer.rows["high_risk"] > 0:
+            print(f"Saved {writer.rows['high_risk']} HIGH-RISK transactions to {writer.paths['high_risk']}")
 
+    def results_frame(self, df: pd.DataFrame, is_anomaly: np.ndarray,
+                      risk_scores: pd.Series, explanations: pd.Series,
+                      rows: Optional[np.ndarray] = None) -> pd.DataFrame:
+        """
+        Transactions with their verdicts, highest risk first; with rows
+        (positions, e.g. from top_k), only those, in that order. Only the
+        selected rows are copied.
+        """
+        risk = np.asarray(risk_scores)
+        if rows is None:
+            rows = top_k(risk, len(risk))
+        columns = [i for i, col in enumerate(df.columns) if col not in IP_KEY_COLUMNS]
+        results_df = df.iloc[rows, columns]
+        results_df["is_anomaly"] = np.asarray(is_anomaly)[rows]
+        results_df["risk_score"] = risk[rows]
+        results_df["risk_category"] = pd.cut(
+            risk[rows],
+            bins=[0, 40, 70, 90, 100],
+            labels=["Low", "Medium", "High", "Critical"]
+        )
+        results_df["explanation"] = np.asarray(explanations, dtype=object)[rows]
+        results_df["model_confidence"] = risk[rows] / 100
+
+        return results_df
+
+    def top_risk(self, df: pd.DataFrame, is_anomaly: np.ndarray, risk_scores: pd.Series,
+                 explanations: pd.Series, k: int = 100,
+                 columns: Optional[List[str]] = None) -> Dict[str, np.ndarray]:
+        """
+        The k highest-risk transactions, highest first, as one array per
+        results_frame column (or per name in `columns`). Selected with top_k,
+        so no sort or scan of the other rows' columns.
+        """
+        top = self.results_frame(df, is_anomaly, risk_scores, explanations, rows=top_k(np.asarray(risk_scores), k))
+        return {col: top[col].to_numpy() for col in (top.columns if columns is None else columns)}
 
 def main():
     detector = EliteFraudDetector(contamination_rate=0.03)
 
-    df = detector.load_and_preprocess("fraud_raw_transactions.csv")
-    features = detector.engineer_features(df)
+    df, features = detector.load_features("fraud_raw_transactions.csv")
     detector.train_ensemble(features)
+    detector.save("fraud_detector_model")
 
     is_anomaly, confidence = detector.predict(features)
     risk_scores = detector.calculate_risk_score(df, features, is_anomaly, confidence)
@@ -618,6 +756,10 @@ CORE COMPONENTS:
    - Handles missing timestamps and numeric values.
 
 2. FEATURE ENGINEERING (100+ features grouped as):
+   Every feature is registered in features.py with its raw input columns,
+   feature dependencies and per-user primitives. engineer_features(names=...)
+   computes only the requested features and what they depend on, and
+   load_and_preprocess(names=...) reads only the CSV columns they need.
    A. Amount-Based:
       - log/sqrt/squared transforms
       - Deviation from user/global medians, z-scores, percentiles
@@ -626,6 +768,7 @@ CORE COMPONENTS:
       - Cyclical encoding (sin/cos) for ML compatibility
    C. Velocity (Time-Window Aggregates):
       - Count & sum of transactions in [1min, 5min, 15min, 1H, 6H, 24H]
+        (all windows in one sweep over the user/time-sorted arrays, see segments.py)
       - Seconds since last transaction, log-transformed interval
       - Deviation from user's average interval
    D. User Behavior:
@@ -647,6 +790,8 @@ CORE COMPONENTS:
    H. IP Address:
       - IP entropy, frequency, rarity
       - New IP per user, shared IP (many users per IP)
+      - /24 subnet frequency, users per subnet (/64 for IPv6)
+      - IPs parsed once at load into integer keys (ip_addresses.py)
    I. Security Indicators:
       - Failed login attempts (raw, binary, high-threshold)
       - Profile update flag, new payee flag
@@ -658,13 +803,47 @@ CORE COMPONENTS:
       - Device-sharing (users per device), IP-device pair frequency
    L. Statistical Aggregates:
       - Rolling mean/std (window=10) per user
+   Incremental mode: engineer_features(batch, state=UserFeatureStore()) folds
+   each batch into persistent per-user state (feature_store.py) so per-user
+   features match a full recomputation at O(batch size) cost.
 
 3. MODELS (Ensemble):
    - Isolation Forest (300 estimators, robust-scaled input)
-   - DBSCAN (eps=3.0, min_samples=10, standard-scaled input)
-   - Elliptic Envelope (Gaussian assumption, robust-scaled)
+   - DBSCAN (eps=3.0, min_samples=10, standard-scaled input); new points are
+     noise unless within eps of a training core sample (nearest-neighbour query)
+   - Elliptic Envelope (Gaussian assumption, robust-scaled); covariance="subsample"
+     fits MinCovDet on 20k random rows, covariance="welford" a one-pass classical
+     covariance, both scoring by Mahalanobis distance to a cached precision matrix
    - Weighted voting: IF (0.5) + DBSCAN (0.3) + EE (0.2)
+   - Members are plugins registered in detectors.py (fit, score_batch,
+     optional score_one, an outlier threshold_) with their weight, input
+     scaling and CPU share; weights={"hbos": 0.2} adds the built-in HBOS
+     histogram detector, {"dbscan": 0} drops a member. predict scores the
+     members in threads over the shared scaled matrices (score_threads)
    - Decision threshold: ≥0.4 → anomaly
+   - fusion="quantile": the same weights over each model's score calibrated
+     to its training quantile table (searchsorted); flags the top
+     contamination_rate by default, set_alert_rate() moves the cutoff at
+     serving time without retraining, and fused_decision() re-decides the
+     kept last_fused_scores under it without rescoring; the confidence
+     behind the risk score is 0 below the cutoff and 0.4-1 above it, as with votes
+   - Optional cascade (cascade=0.99): a 50-tree forest screens every row and
+     only rows past its cutoff are scored by the 300-tree forest (DBSCAN and
+     the elliptic layer are cheap and score every row); cascade_report()
+     measures its recall against the full ensemble
+   - Feature importance: |correlation| with the forest's scores, one
+     matrix-vector product over the standard-scaled matrix (importance_sample
+     reads a random subset); permutation_sample=N also computes permutation
+     importance on N rows in a background process (importance.py), which
+     save() waits for
+   - Optional pruning (prune=0.95): constant, near-constant and redundant
+     features (rank correlation above the cutoff with a kept one, e.g. the
+     amount transforms) are dropped before training; only the kept ones are
+     computed and scaled when scoring (selection.py)
+   - Optional projection (projection="pca" or "random", projection_dims=16):
+     DBSCAN and the elliptic layer fit and score on a low-dimensional
+     projection of their scaled input, fitted once and saved with the model;
+     benchmarks/bench_projection.py measures speed and agreement by dimension
 
 4. RISK SCORING (0–100):
    - Base: model confidence (0–50)
@@ -674,14 +853,28 @@ CORE COMPONENTS:
        * Failed logins (max +10): attempts × 3
        * Impossible travel: +10 if flagged
        * New entities (max +10): new payee/country/device
+   - Penalties and explanation reasons come from one declarative rule spec
+     (model/risk_rules.json: condition, points, cap, group cap, reason text,
+     priority), compiled once (rules.py); edit it, or pass rules=<file or
+     dict>, to retune without code changes or retraining. Each batch's
+     penalties, and its reasons, are one fused expression, run by numexpr
+     when installed and by NumPy otherwise
 
 5. EXPLAINABILITY:
    - Human-readable, prioritized reason strings (max 5 per anomaly)
+   - The spec's reasons are tested in one pass over the flagged rows, packed
+     into a reason bitmask per row, and rendered as text for those rows only
    - Rules cover: geographic, behavioral, temporal, device, network anomalies
 
 6. OUTPUTS:
-   - CSV: full results (sorted by risk), with risk category & explanation
-   - JSON: summary report (counts, distributions, top features)
+   - CSV: full results (sorted by risk), with risk category & explanation;
+     an output file ending in .parquet, .arrow or .csv.zst gets zstd-compressed
+     Parquet, Arrow IPC (explanations dictionary-encoded) or CSV instead,
+     written with its HIGH_RISK subset in one pass (export.py); run_chunked()
+     streams those formats a row group per shard
+   - JSON: summary report (counts, distributions, top features), formatted
+     from a risk histogram built in one bincount pass; chunked runs merge the
+     per-shard histograms instead of keeping scores (global_stats.RiskHistogram)
    - CSV: HIGH_RISK subset (risk ≥70)
    - PNG: 6-panel visualization (risk dist, amount-risk, hourly, feature importance, geo, pie)
 
@@ -691,7 +884,7 @@ CORE COMPONENTS:
 
 DESIGN PRINCIPLES:
 - Robust to missing data (fillna(0), safe division)
-- Scalable: uses vectorized groupby ops, avoid loops
+- Scalable: per-user features are segment ops over one shared user index (segments.GroupIndex), no loops
 - Reproducible: fixed random_state=42
 - Production-ready: error-handled, typed, documented
 
@@ -704,6 +897,26 @@ PERFORMANCE:
 - Training: O(n log n) due to tree-based models
 - Prediction: O(n) per model; ensemble adds constant overhead
 - RAM: ~5x input size due to feature generation
+- Concurrent training: with train_cpus (per-member budgets or "auto"), the models
+  are fitted concurrently in threads that share the scaled matrices, each
+  limited to its budget, so training takes about as long as the slowest one
+- Multi-core: EliteFraudDetector(n_jobs=N) computes per-user features on
+  user-contiguous shards in worker processes that read the frame from shared
+  memory; cross-user features run as whole-frame reduction tasks (parallel.py)
+- Warm start: save() writes the trained ensemble, thresholds, category
+  vocabularies and feature list as a versioned artifact directory;
+  EliteFraudDetector.load() unpickles it in milliseconds and memory-maps its
+  large arrays, so a server worker scores without retraining (artifact.py)
+- Repeated uploads: with cache=FeatureCache(dir), load_features() keys the
+  parsed frame and features by file hash + feature code version and maps
+  them back from per-column .npy files (feature_cache.py)
+- Larger-than-memory files: run_chunked() shards rows by user_id hash on disk,
+  merges whole-file statistics (amount moments/ranks, value counts, users per
+  device/IP) from chunk summaries, and scores one shard at a time within
+  memory_budget_mb (chunked.py, global_stats.py)
+- Top-K: top_risk() returns the k highest-risk rows as column arrays, and
+  the HIGH_RISK export and the /predict response select their rows the same
+  way, with argpartition plus a sort of the k selected (topk.py)
 
 USE CASES:
 - Payment fraud (cards, ACH, wire)
@@ -0,0 +1,71 @@
+import json
+import os
+import pickle
+import shutil
+import tempfile
+from typing import Dict
+
+import numpy as np
+import sklearn
+
+# Bump when the layout or the saved state changes
+ARTIFACT_FORMAT = 3
+# Arrays at least this large are stored as their own .npy file and memory-mapped on load
+MMAP_MIN_BYTES = 2 ** 16
+
+
+def write_artifact(path: str, state: Dict, manifest: Dict) -> None:
+    """
+    Saves `state` to the directory `path`:
+      manifest.json - format and library versions plus `manifest`, readable without unpickling
+      state.pkl     - `state`, pickled (protocol 5) with its large arrays left out of band
+      buffer_i.npy  - the raw bytes of each large array, in pickling order
+    An existing artifact at `path` is replaced whole; processes that mapped
+    it keep their (now unlinked) files.
+    """
+    buffers = []
+    data = pickle.dumps(state, protocol=5,
+                        buffer_callback=lambda buf: buf.raw().nbytes < MMAP_MIN_BYTES or buffers.append(buf))
+    manifest = dict(manifest, format=ARTIFACT_FORMAT, sklearn_version=sklearn.__version__,
+                    numpy_version=np.__version__, n_buffers=len(buffers))
+
+    parent = os.path.dirname(os.path.abspath(path))
+    scratch = tempfile.mkdtemp(prefix=".artifact-", dir=parent)
+    try:
+        for i, buf in enumerate(buffers):
+            np.save(os.path.join(scratch, f"buffer_{i}.npy"), np.frombuffer(buf.raw(), dtype=np.uint8))
+        with open(os.path.join(scratch, "state.pkl"), "wb") as f:
+            f.write(data)
+        with open(os.path.join(scratch, "manifest.json"), "w") as f:
+            json.dump(manifest, f, indent=2)
+
+        old = None
+        if os.path.exists(path):
+            old = tempfile.mkdtemp(prefix=".artifact-old-", dir=parent)
+            os.rename(path, os.path.join(old, "artifact"))
+        os.rename(scratch, path)
+    except OSError:
+        shutil.rmtree(scratch, ignore_errors=True)
+        raise
+    if old is not None:
+        shutil.rmtree(old, ignore_errors=True)
+
+
+def read_manifest(path: str) -> Dict:
+    with open(os.path.join(path, "manifest.json")) as f:
+        manifest = json.load(f)
+    if manifest.get("format") != ARTIFACT_FORMAT:
+        raise ValueError(f"{path} has artifact format {manifest.get('format')}, expected {ARTIFACT_FORMAT}")
+    return manifest
+
+
+def read_artifact(path: str, mmap: bool = True) -> Dict:
+    """The state write_artifact saved; with mmap, its large arrays are copy-on-write views of the files."""
+    manifest = read_manifest(path)
+    if manifest["sklearn_version"] != sklearn.__version__:
+        print(f"Warning: {path} was saved with scikit-learn {manifest['sklearn_version']}, "
+              f"running {sklearn.__version__}")
+    buffers = [np.load(os.path.join(path, f"buffer_{i}.npy"), mmap_mode="c" if mmap else None)
+               for i in range(manifest["n_buffers"])]
+    with open(os.path.join(path, "state.pkl"), "rb") as f:
+        return pickle.loads(f.read(), buffers=buffers)
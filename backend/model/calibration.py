@@ -0,0 +1,22 @@
+import numpy as np
+
+# Quantiles kept per score table; calibrated ranks resolve to 1/(TABLE_SIZE - 1)
+TABLE_SIZE = 1001
+
+
+def quantile_table(scores, size: int = TABLE_SIZE) -> np.ndarray:
+    """Scores at `size` evenly spaced quantiles; actual observations, so infinite scores are fine."""
+    return np.quantile(np.asarray(scores, dtype=np.float64), np.linspace(0, 1, size), method="lower")
+
+
+def outlier_rank(table: np.ndarray, scores) -> np.ndarray:
+    """
+    Share of the table at or above each score, for scores where lower is more
+    abnormal (sklearn's convention): 1 for a score below everything seen in
+    training, 0 for one above it. One binary search per score.
+    """
+    return 1 - np.searchsorted(table, np.asarray(scores, dtype=np.float64), side="left") / len(table)
+
+
+def table_quantile(table: np.ndarray, q: float) -> float:
+    return float(table[int(round(q * (len(table) - 1)))])
@@ -0,0 +1,225 @@
+import csv
+import heapq
+import json
+import os
+import pickle
+import shutil
+import tempfile
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from .feature_store import ENTITY_STATS
+from .export import COLUMNAR_FORMATS, ResultWriter, export_format, open_text, sibling_path
+from .global_stats import GlobalStats, RiskHistogram
+
+# Peak bytes per transaction while one shard is engineered, trained on and
+# scored, by compact mode; measured at 50k-100k rows, where DBSCAN
+# neighbourhoods and MinCovDet dominate. Interpreter and libraries come on top.
+PEAK_BYTES_PER_ROW = {False: 10000, True: 9000}
+# Share of the budget for a raw CSV chunk while it is parsed, summarized and split
+CHUNK_BUDGET_SHARE = 0.25
+SAMPLE_ROWS = 10000
+
+
+class ChunkedPipeline:
+    """
+    Out-of-core run of an EliteFraudDetector for files larger than memory.
+
+    1. Stream the CSV in chunks, append each chunk's rows to on-disk shards by
+       user_id hash and merge the chunk's GlobalStats summary into the total.
+    2. Count distinct users per shared device/IP shard by shard (shards hold
+       disjoint users, so the counts add up).
+    3. Engineer features, score and explain one shard at a time; cross-user
+       features read the global stats, so each row gets the same values as in
+       a whole-file run. An untrained detector is fitted on the first shard.
+    4. Merge the per-shard results, each sorted by risk, into the export files.
+       Parquet and Arrow outputs skip the merge: each shard's results are
+       written as a row group as soon as they are scored (export.py).
+
+    Shard sizes follow memory_budget_mb, so peak memory is bounded by the
+    budget rather than by the input size.
+    """
+
+    def __init__(self, detector, memory_budget_mb: int = 2048, work_dir: Optional[str] = None):
+        self.detector = detector
+        self.memory_budget = memory_budget_mb * 2 ** 20
+        self.work_dir = work_dir
+        self.stats = GlobalStats()
+        self.shard_files: List[str] = []
+        self.result_files: List[str] = []
+
+    def run(self, filepath: str, output_file: str = "fraud_detection_results.csv") -> Dict:
+        workspace = tempfile.mkdtemp(prefix="fraud_shards_", dir=self.work_dir)
+        try:
+            self.shard(filepath, workspace)
+            self.count_users()
+            if export_format(output_file) in COLUMNAR_FORMATS:
+                with ResultWriter(output_file) as writer:
+                    counts = self.score(workspace, writer)
+                return self.export(counts, output_file, writer)
+            counts = self.score(workspace)
+            return self.export(counts, output_file)
+        finally:
+            self.shard_files, self.result_files = [], []
+            shutil.rmtree(workspace, ignore_errors=True)
+
+    def plan(self, filepath: str) -> Dict[str, int]:
+        """Chunk and shard sizes for this file, estimated from its first rows."""
+        with open(filepath, "rb") as f:
+            sample = b"".join(line for _, line in zip(range(SAMPLE_ROWS + 1), f))
+        head = pd.read_csv(filepath, nrows=SAMPLE_ROWS)
+        rows = max(len(head), 1)
+
+        estimated_rows = os.path.getsize(filepath) * rows // max(len(sample), 1)
+        raw_bytes = head.memory_usage(deep=True).sum() / rows
+        shard_rows = max(int(self.memory_budget / PEAK_BYTES_PER_ROW[self.detector.compact]), 1)
+        return {
+            "chunk_rows": max(int(self.memory_budget * CHUNK_BUDGET_SHARE / raw_bytes), 1),
+            "n_shards": max(int(np.ceil(estimated_rows / shard_rows)), 1),
+        }
+
+    def shard(self, filepath: str, workspace: str) -> None:
+        plan = self.plan(filepath)
+        n_shards = plan["n_shards"]
+        print(f"Sharding {filepath} into {n_shards} shards of users "
+              f"({plan['chunk_rows']:,} rows per chunk)...")
+
+        # Keys are read as text so every chunk hashes and counts them the same way. Every
+        # column is kept, trained detector or not: the export carries the input rows, and
+        # score() only computes the features the detector needs
+        keys = ["user_id", "ip_address"] + list(ENTITY_STATS) + self.detector.CATEGORICAL_COLUMNS
+        reader = pd.read_csv(filepath, chunksize=plan["chunk_rows"], dtype=dict.fromkeys(keys, str))
+
+        self.shard_files = [os.path.join(workspace, f"shard_{i:04d}.pkl") for i in range(n_shards)]
+        handles = [open(path, "wb") for path in self.shard_files]
+        loaded = removed = 0
+        try:
+            for chunk in reader:
+                chunk = self.detector.standardize(chunk)
+                initial_count = len(chunk)
+                chunk = chunk.dropna(subset=["transaction_amount", "transaction_time", "user_id"])
+                loaded += len(chunk)
+                removed += initial_count - len(chunk)
+
+                self.stats = self.stats.merge(GlobalStats.of(chunk))
+                shard_ids = pd.util.hash_array(chunk["user_id"].to_numpy(dtype=object)) % n_shards
+                for shard_id, part in chunk.groupby(shard_ids, sort=False):
+                    pickle.dump(part, handles[shard_id], protocol=pickle.HIGHEST_PROTOCOL)
+        finally:
+            for handle in handles:
+                handle.close()
+        print(f"Loaded {loaded:,} transactions ({removed:,} removed)")
+
+    def load_shard(self, shard_id: int) -> pd.DataFrame:
+        parts = []
+        with open(self.shard_files[shard_id], "rb") as f:
+            while True:
+                try:
+                    parts.append(pickle.load(f))
+                except EOFError:
+                    break
+        if not parts:
+            return pd.DataFrame()
+
+        df = pd.concat(parts, ignore_index=True)
+        # Stable sort, so equal timestamps keep file order as in load_and_preprocess
+        df = df.sort_values(["user_id", "transaction_time"], kind="stable").reset_index(drop=True)
+        if self.detector.compact:
+            for col in self.detector.CATEGORICAL_COLUMNS:
+                if col in df.columns:
+                    df[col] = df[col].astype("category")
+        return df
+
+    def count_users(self) -> None:
+        for shard_id in range(len(self.shard_files)):
+            df = self.load_shard(shard_id)
+            if len(df):
+                self.stats.add_users(df)
+
+    def score(self, workspace: str, writer: Optional[ResultWriter] = None) -> RiskHistogram:
+        """Score shard by shard; each shard's results go to writer as they come, or to a sorted CSV in workspace."""
+        detector = self.detector
+        cutoff = self.stats.amount_ranks.map(np.log1p).quantile(0.99)
+        counts = RiskHistogram()
+        for shard_id in range(len(self.shard_files)):
+            df = self.load_shard(shard_id)
+            if not len(df):
+                continue
+            print(f"Shard {shard_id + 1}/{len(self.shard_files)}: {len(df):,} transactions")
+
+            if not detector.feature_names:
+                features = detector.engineer_features(df, global_stats=self.stats)
+                detector.train_ensemble(features)
+            else:
+                features = detector.engineer_features(df, names=detector.required_features(), global_stats=self.stats)
+
+            is_anomaly, confidence = detector.predict(features)
+            risk_scores = detector.calculate_risk_score(df, features, is_anomaly, confidence)
+            explanations = detector.generate_explanations(df, features, is_anomaly, risk_scores,
+                                                          log_amount_cutoff=cutoff)
+            counts = counts.merge(detector.report_counts(is_anomaly, risk_scores))
+
+            results = detector.results_frame(df, is_anomaly, risk_scores, explanations)
+            if writer is not None:
+                writer.write(results)
+            else:
+                path = os.path.join(workspace, f"results_{shard_id:04d}.csv")
+                results.to_csv(path, index=False)
+                self.result_files.append(path)
+            os.remove(self.shard_files[shard_id])
+        return counts
+
+    def export(self, counts: RiskHistogram, output_file: str, writer: Optional[ResultWriter] = None) -> Dict:
+        """
+        Write the report, and merge the risk-sorted shard results into the
+        same CSV files export_results writes; columnar results were already
+        streamed to writer, one row group per shard, each sorted by risk.
+        """
+        print(f"Exporting results to {output_file}...")
+        report = self.detector.format_report(counts)
+        report_file = sibling_path(output_file, "_report", ".json")
+        with open(report_file, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Saved analysis report to {report_file}")
+        if writer is not None:
+            print(f"Saved {writer.rows['all']} transactions to {output_file}")
+            if writer.rows["high_risk"] > 0:
+                print(f"Saved {writer.rows['high_risk']} HIGH-RISK transactions to {writer.paths['high_risk']}")
+            return report
+        if not self.result_files:
+            return report
+
+        sources = [open(path, newline="") for path in self.result_files]
+        high_risk_file = sibling_path(output_file, "_HIGH_RISK")
+        high_risk = None
+        written = high_risk_count = 0
+        try:
+            readers = [csv.reader(source) for source in sources]
+            header = [next(reader) for reader in readers][0]
+            risk = header.index("risk_score")
+            with open_text(output_file) as out:
+                writer = csv.writer(out, lineterminator="\n")
+                writer.writerow(header)
+                # Highest risk first, so the high-risk rows are a prefix of the stream
+                for row in heapq.merge(*readers, key=lambda row: -float(row[risk])):
+                    writer.writerow(row)
+                    written += 1
+                    if float(row[risk]) >= 70:
+                        if high_risk is None:
+                            high_risk = open_text(high_risk_file)
+                            high_risk_writer = csv.writer(high_risk, lineterminator="\n")
+                            high_risk_writer.writerow(header)
+                        high_risk_writer.writerow(row)
+                        high_risk_count += 1
+        finally:
+            for source in sources:
+                source.close()
+            if high_risk is not None:
+                high_risk.close()
+
+        print(f"Saved {written} transactions to {output_file}")
+        if high_risk_count:
+            print(f"Saved {high_risk_count} HIGH-RISK transactions to {high_risk_file}")
+        return report
@@ -0,0 +1,36 @@
+import numpy as np
+import pandas as pd
+from typing import Optional, Tuple
+
+# How a column is held as one flat numpy array, for shared memory and the
+# on-disk cache:
+#   "array"    - plain numeric, bool or datetime values
+#   "category" - Categorical codes; `values` holds the categories
+#   "masked"   - nullable signed integers (Int64 and the like); the type's minimum
+#                marks a missing value
+#   "object"   - factorize codes of any other column; `values` holds the
+#                distinct values, code -1 marks a missing value
+
+
+def encode_column(column: pd.Series) -> Tuple[str, np.ndarray, Optional[np.ndarray]]:
+    """(kind, data, values) for a column; see decode_column."""
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        return "category", column.cat.codes.to_numpy(), np.asarray(column.cat.categories)
+    if isinstance(column.dtype, np.dtype) and column.dtype != object:
+        return "array", column.to_numpy(), None
+    if pd.api.types.is_signed_integer_dtype(column.dtype):
+        dtype = column.dtype.numpy_dtype
+        return "masked", column.to_numpy(dtype=dtype, na_value=np.iinfo(dtype).min), None
+    codes, uniques = pd.factorize(column)
+    return "object", codes, np.asarray(uniques, dtype=object)
+
+
+def decode_column(kind: str, data: np.ndarray, values: Optional[np.ndarray]):
+    """The column encode_column produced `data` from; plain arrays are returned as they are, without copying."""
+    if kind == "category":
+        return pd.Categorical.from_codes(data, categories=values)
+    if kind == "masked":
+        return pd.arrays.IntegerArray(data, data == np.iinfo(data.dtype).min)
+    if kind == "object":
+        return np.where(data >= 0, values[np.maximum(data, 0)] if len(values) else None, np.nan)
+    return data
@@ -0,0 +1,78 @@
+import numpy as np
+from scipy.linalg import pinvh
+from sklearn.covariance import MinCovDet
+
+from .moments import merge_moments
+
+# Rows per block when accumulating the covariance or scoring (here and by HBOS),
+# bounding the temporary (block x features) copies
+BLOCK_ROWS = 65536
+
+
+class FastEllipticEnvelope:
+    """
+    A drop-in for EllipticEnvelope that avoids running MinCovDet on every row.
+
+    method="subsample": MinCovDet on at most subsample_size random rows (all
+        rows when there are fewer, which gives EllipticEnvelope's own fit).
+    method="welford": the classical mean and covariance, accumulated block by
+        block with Chan's merge; one pass, not robust to the outliers it scores.
+
+    Either way the precision matrix is computed once and whole batches are
+    scored by a vectorized Mahalanobis distance against it. The outlier
+    threshold is the contamination percentile over all training rows.
+    """
+
+    def __init__(self, contamination: float = 0.1, method: str = "subsample", subsample_size: int = 20000,
+                 random_state=None):
+        if method not in ("subsample", "welford"):
+            raise ValueError(f"Unknown covariance method {method!r}")
+        self.contamination = contamination
+        self.method = method
+        self.subsample_size = subsample_size
+        self.random_state = random_state
+
+    def fit(self, X) -> "FastEllipticEnvelope":
+        X = np.asarray(X)
+        if self.method == "subsample":
+            rows = X
+            if len(X) > self.subsample_size:
+                rng = np.random.default_rng(self.random_state)
+                rows = X[np.sort(rng.choice(len(X), self.subsample_size, replace=False))]
+            mcd = MinCovDet(random_state=self.random_state).fit(rows)
+            self.location_, self.covariance_, self.precision_ = mcd.location_, mcd.covariance_, mcd.get_precision()
+        else:
+            n, mean, m2 = 0, np.zeros(X.shape[1]), np.zeros((X.shape[1], X.shape[1]))
+            for start in range(0, len(X), BLOCK_ROWS):
+                n, mean, m2 = merge_moments(n, mean, m2, *_block_moments(X[start:start + BLOCK_ROWS]))
+            self.location_ = mean
+            self.covariance_ = m2 / max(n, 1)  # biased, as EmpiricalCovariance estimates it
+            self.precision_ = pinvh(self.covariance_, check_finite=False)
+        self.offset_ = np.percentile(self.score_samples(X), 100.0 * self.contamination)
+        return self
+
+    def mahalanobis(self, X) -> np.ndarray:
+        """Squared Mahalanobis distance of each row, as EllipticEnvelope.mahalanobis gives."""
+        X = np.asarray(X)
+        distances = np.empty(len(X))
+        for start in range(0, len(X), BLOCK_ROWS):
+            centered = X[start:start + BLOCK_ROWS] - self.location_
+            distances[start:start + BLOCK_ROWS] = np.einsum("ij,ij->i", centered @ self.precision_, centered)
+        return distances
+
+    def score_samples(self, X) -> np.ndarray:
+        return -self.mahalanobis(X)
+
+    def decision_function(self, X) -> np.ndarray:
+        return self.score_samples(X) - self.offset_
+
+    def predict(self, X) -> np.ndarray:
+        return np.where(self.decision_function(X) >= 0, 1, -1)
+
+
+def _block_moments(block: np.ndarray):
+    """Count, mean and co-moment matrix of a block of rows, for merge_moments."""
+    block = np.asarray(block, dtype=np.float64)
+    mean = block.mean(axis=0)
+    centered = block - mean
+    return len(block), mean, centered.T @ centered
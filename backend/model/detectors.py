@@ -0,0 +1,183 @@
+from typing import Callable, Dict, Optional
+
+import numpy as np
+from sklearn.covariance import EllipticEnvelope
+from sklearn.ensemble import IsolationForest
+
+from .covariance import BLOCK_ROWS, FastEllipticEnvelope
+from .inductive_dbscan import InductiveDBSCAN
+
+
+class Detector:
+    """
+    An ensemble member. Subclasses implement fit and score_batch, and set
+    threshold_ in fit: rows scoring below it are the member's outliers (its
+    vote with fusion="vote"). score_one has a default built on score_batch.
+    """
+
+    threshold_: float
+
+    def fit(self, X) -> "Detector":
+        raise NotImplementedError
+
+    def score_batch(self, X) -> np.ndarray:
+        """Score of each row; lower is more abnormal, as in sklearn's score_samples."""
+        raise NotImplementedError
+
+    def score_one(self, x) -> float:
+        """Score of a single row; override where one row can skip the batch machinery."""
+        return float(self.score_batch(np.asarray(x).reshape(1, -1))[0])
+
+    def is_outlier(self, X) -> np.ndarray:
+        return self.score_batch(X) < self.threshold_
+
+
+class DetectorSpec:
+    """A registered detector and how the ensemble runs it."""
+
+    def __init__(self, name: str, factory: Callable, weight: float, scaling: str = "robust",
+                 distance_based: bool = False, cpu_share: float = 0.25):
+        self.name = name
+        self.factory = factory                # (ensemble, n_jobs) -> unfitted Detector
+        self.weight = weight                  # default share of the fused score; 0 leaves it out
+        self.scaling = scaling                # scaled matrix it reads: "robust" or "standard"
+        self.distance_based = distance_based  # fed through the projection front end (projection.py)
+        self.cpu_share = cpu_share            # share of the cores with train_cpus="auto"
+
+
+DETECTORS: Dict[str, DetectorSpec] = {}
+
+
+def register_detector(name: str, factory: Callable, weight: float, scaling: str = "robust",
+                      distance_based: bool = False, cpu_share: float = 0.25) -> None:
+    if scaling not in ("robust", "standard"):
+        raise ValueError(f"{name}: unknown scaling {scaling!r}")
+    DETECTORS[name] = DetectorSpec(name, factory, weight, scaling, distance_based, cpu_share)
+
+
+def detector_weights(overrides: Optional[Dict[str, float]] = None) -> Dict[str, float]:
+    """Registered weights with `overrides` applied; members weighted 0 are left out."""
+    unknown = set(overrides or {}) - set(DETECTORS)
+    if unknown:
+        raise ValueError(f"Unknown detectors {sorted(unknown)}, registered: {list(DETECTORS)}")
+    weights = {name: spec.weight for name, spec in DETECTORS.items()}
+    weights.update(overrides or {})
+    return {name: weight for name, weight in weights.items() if weight > 0}
+
+
+class IsolationForestDetector(Detector):
+    def __init__(self, contamination: float, n_jobs=None):
+        self.model = IsolationForest(
+            n_estimators=300,
+            contamination=contamination,
+            max_samples='auto',
+            max_features=1.0,
+            bootstrap=True,
+            random_state=42,
+            n_jobs=n_jobs
+        )
+
+    def fit(self, X) -> "IsolationForestDetector":
+        self.model.fit(X)
+        self.threshold_ = self.model.offset_
+        return self
+
+    def score_batch(self, X) -> np.ndarray:
+        return self.model.score_samples(X)
+
+
+class DBSCANDetector(Detector):
+    """DBSCAN clustered once; new points score minus their distance to the nearest core sample."""
+
+    def __init__(self, n_jobs=None):
+        self.model = InductiveDBSCAN(eps=3.0, min_samples=10, n_jobs=n_jobs)
+
+    def fit(self, X) -> "DBSCANDetector":
+        self.model.fit(X)
+        # Noise: no core sample within eps
+        self.threshold_ = -self.model.eps
+        return self
+
+    def score_batch(self, X) -> np.ndarray:
+        return self.model.score_samples(X)
+
+
+class EllipticDetector(Detector):
+    """EllipticEnvelope, or FastEllipticEnvelope for covariance="subsample" / "welford"."""
+
+    def __init__(self, contamination: float, covariance: str = "full"):
+        if covariance == "full":
+            self.model = EllipticEnvelope(contamination=contamination, random_state=42)
+        else:
+            self.model = FastEllipticEnvelope(contamination=contamination, method=covariance, random_state=42)
+
+    def fit(self, X) -> "EllipticDetector":
+        self.model.fit(X)
+        self.threshold_ = self.model.offset_
+        return self
+
+    def score_batch(self, X) -> np.ndarray:
+        return self.model.score_samples(X)
+
+
+class HBOSDetector(Detector):
+    """
+    Histogram-based outlier score: one equal-width histogram per feature,
+    fitted in one pass, and a row scores the sum of the log heights of the
+    bins its values fall in (heights scaled so the fullest bin is 1, plus
+    alpha so empty bins stay finite). Features are treated as independent,
+    so scoring is one table lookup per value, O(n) per feature. Values past
+    the training range by more than tol bin widths count as an empty bin.
+    """
+
+    def __init__(self, contamination: float, n_bins: int = 10, alpha: float = 0.1, tol: float = 0.5):
+        self.contamination = contamination
+        self.n_bins = n_bins
+        self.alpha = alpha
+        self.tol = tol
+
+    def fit(self, X) -> "HBOSDetector":
+        X = np.asarray(X, dtype=np.float64)
+        self.low_ = X.min(axis=0)
+        width = (X.max(axis=0) - self.low_) / self.n_bins
+        self.width_ = np.where(width > 0, width, 1.0)
+        counts = np.zeros((X.shape[1], self.n_bins + 1))
+        bins = self._bins(X)
+        for j in range(X.shape[1]):
+            counts[j] = np.bincount(bins[:, j], minlength=self.n_bins + 1)
+        counts[:, -1] = 0  # the out-of-range slot, empty by construction
+        heights = (counts + self.alpha) / (counts.max(axis=1, keepdims=True) + self.alpha)
+        self.log_heights_ = np.log(heights)
+        self.threshold_ = np.percentile(self.score_batch(X), 100.0 * self.contamination)
+        return self
+
+    def _bins(self, X: np.ndarray) -> np.ndarray:
+        """Bin of each value, n_bins for values out of range."""
+        position = (X - self.low_) / self.width_
+        bins = np.clip(position, 0, self.n_bins - 1).astype(np.intp)
+        bins[(position < -self.tol) | (position >= self.n_bins + self.tol) | np.isnan(position)] = self.n_bins
+        return bins
+
+    def score_batch(self, X) -> np.ndarray:
+        X = np.asarray(X, dtype=np.float64)
+        offsets = np.arange(X.shape[1]) * (self.n_bins + 1)
+        table = self.log_heights_.ravel()
+        scores = np.empty(len(X))
+        for start in range(0, len(X), BLOCK_ROWS):
+            scores[start:start + BLOCK_ROWS] = table[self._bins(X[start:start + BLOCK_ROWS]) + offsets].sum(axis=1)
+        return scores
+
+    def score_one(self, x) -> float:
+        x = np.asarray(x, dtype=np.float64).ravel()
+        return float(self.log_heights_[np.arange(len(x)), self._bins(x)].sum())
+
+
+register_detector("isolation_forest", lambda ensemble, n_jobs: IsolationForestDetector(
+    ensemble.contamination_rate, n_jobs), weight=0.5, cpu_share=0.5)
+register_detector("dbscan", lambda ensemble, n_jobs: DBSCANDetector(n_jobs), weight=0.3, scaling="standard",
+                  distance_based=True)
+register_detector("elliptic", lambda ensemble, n_jobs: EllipticDetector(
+    ensemble.contamination_rate, ensemble.covariance), weight=0.2, distance_based=True)
+# Cheap, but off unless given a weight, e.g. EliteFraudDetector(weights={"hbos": 0.2})
+register_detector("hbos", lambda ensemble, n_jobs: HBOSDetector(ensemble.contamination_rate), weight=0.0,
+                  cpu_share=0.0)
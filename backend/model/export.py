@@ -0,0 +1,152 @@
+import io
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:  # only the Parquet, Arrow and zstd CSV formats need it
+    pa = None
+
+# Output format of each file suffix; anything else is written as CSV
+EXPORT_FORMATS = {".csv.zst": "csv.zst", ".parquet": "parquet", ".arrow": "arrow", ".feather": "arrow", ".csv": "csv"}
+# Formats written shard by shard as row groups; a chunked CSV export is merged into one risk-sorted file
+COLUMNAR_FORMATS = ("parquet", "arrow")
+# Rows scoring at least this also go to the HIGH_RISK file
+HIGH_RISK_SCORE = 70
+# Rows per Parquet row group and per Arrow record batch
+ROW_GROUP_ROWS = 1_000_000
+# Columns dictionary-encoded in the columnar formats, besides any categorical ones
+DICTIONARY_COLUMNS = ["explanation", "risk_category"]
+
+
+def export_format(path: str) -> str:
+    return next((fmt for suffix, fmt in EXPORT_FORMATS.items() if path.endswith(suffix)), "csv")
+
+
+def sibling_path(path: str, tag: str, suffix: Optional[str] = None) -> str:
+    """path with tag before its format suffix, e.g. results.csv.zst -> results_HIGH_RISK.csv.zst."""
+    known = next((s for s in EXPORT_FORMATS if path.endswith(s)), "")
+    stem = path[:len(path) - len(known)] if known else path
+    return stem + tag + (known if suffix is None else suffix)
+
+
+def open_text(path: str):
+    """A text file to write CSV to, zstd-compressed for .csv.zst."""
+    if export_format(path) != "csv.zst":
+        return open(path, "w", newline="", encoding="utf-8")
+    if pa is None:
+        raise ImportError("Writing .csv.zst needs pyarrow")
+    return io.TextIOWrapper(pa.CompressedOutputStream(path, "zstd"), encoding="utf-8", newline="")
+
+
+class _Vocabulary:
+    """
+    Values seen so far in one dictionary-encoded column. Each batch's
+    dictionary extends the previous one, so an Arrow IPC file can take it as
+    a delta (IPC files can't replace a dictionary) and Parquet as is.
+    """
+
+    def __init__(self):
+        self.values = pd.Index([], dtype=object)
+
+    def encode(self, column: pd.Series) -> "pa.DictionaryArray":
+        codes, uniques = pd.factorize(column)
+        uniques = np.asarray(uniques, dtype=object)
+        positions = self.values.get_indexer(uniques)
+        new = positions < 0
+        positions[new] = len(self.values) + np.arange(new.sum())
+        if new.any():
+            self.values = self.values.append(pd.Index(uniques[new], dtype=object))
+        indices = pa.array(positions[codes].astype(np.int32), mask=codes < 0)
+        values = pa.array(self.values.to_numpy(), from_pandas=True)
+        return pa.DictionaryArray.from_arrays(indices, values if len(values) else values.cast(pa.string()))
+
+
+class ResultWriter:
+    """
+    Writes results frames (EliteFraudDetector.results_frame) to output_file
+    batch by batch, as they are scored, in the format its suffix names:
+      - .csv: text as pandas writes it, for existing consumers
+      - .csv.zst: the same text, zstd-compressed
+      - .parquet: zstd-compressed, a row group per ROW_GROUP_ROWS rows
+      - .arrow / .feather: Arrow IPC file of zstd-compressed record batches
+    Rows scoring at least high_risk also go to the _HIGH_RISK file in the
+    same pass; it is only created once one arrives. In the columnar formats
+    explanations, risk categories and categorical columns are
+    dictionary-encoded, so the repeated texts are stored once.
+    """
+
+    def __init__(self, output_file: str, high_risk: float = HIGH_RISK_SCORE):
+        self.format = export_format(output_file)
+        if self.format != "csv" and pa is None:
+            raise ImportError(f"Writing {self.format} needs pyarrow")
+        self.paths = {"all": output_file, "high_risk": sibling_path(output_file, "_HIGH_RISK")}
+        self.high_risk = high_risk
+        self.rows = {"all": 0, "high_risk": 0}
+        self._sinks: Dict = {}
+        self._schema = None
+        self._vocabularies: Dict[str, _Vocabulary] = {}
+
+    def __enter__(self) -> "ResultWriter":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def write(self, results: pd.DataFrame) -> None:
+        """Append results, ROW_GROUP_ROWS rows at a time."""
+        for start in range(0, max(len(results), 1), ROW_GROUP_ROWS):
+            self._write(results.iloc[start:start + ROW_GROUP_ROWS])
+
+    def _write(self, results: pd.DataFrame) -> None:
+        high_risk = results["risk_score"].to_numpy() >= self.high_risk
+        if self.format in ("csv", "csv.zst"):
+            self._write_csv("all", results)
+            if high_risk.any():
+                self._write_csv("high_risk", results[high_risk])
+            return
+        table = self._table(results)
+        self._write_table("all", table)
+        if high_risk.any():
+            self._write_table("high_risk", table.filter(pa.array(high_risk)))
+
+    def close(self) -> None:
+        for sink in self._sinks.values():
+            sink.close()
+        self._sinks = {}
+
+    def _write_csv(self, sink: str, results: pd.DataFrame) -> None:
+        # The header goes with the first write, even of an empty batch
+        header = sink not in self._sinks
+        if header:
+            self._sinks[sink] = open_text(self.paths[sink])
+        results.to_csv(self._sinks[sink], header=header, index=False)
+        self.rows[sink] += len(results)
+
+    def _table(self, results: pd.DataFrame) -> "pa.Table":
+        encoded = [col for col in results.columns
+                   if col in DICTIONARY_COLUMNS or isinstance(results[col].dtype, pd.CategoricalDtype)]
+        plain = pa.Table.from_pandas(results.drop(columns=encoded), preserve_index=False)
+        arrays = [self._vocabularies.setdefault(col, _Vocabulary()).encode(results[col]) if col in encoded
+                  else plain.column(col) for col in results.columns]
+        table = pa.table(arrays, names=list(results.columns))
+        # Every batch takes the first one's types, e.g. a column that is all missing in one shard
+        if self._schema is None:
+            self._schema = table.schema
+        elif not table.schema.equals(self._schema):
+            table = table.cast(self._schema)
+        return table
+
+    def _write_table(self, sink: str, table: "pa.Table") -> None:
+        if sink not in self._sinks:
+            if self.format == "parquet":
+                self._sinks[sink] = pa.parquet.ParquetWriter(self.paths[sink], self._schema, compression="zstd")
+            else:
+                options = pa.ipc.IpcWriteOptions(compression="zstd", emit_dictionary_deltas=True)
+                self._sinks[sink] = pa.ipc.new_file(self.paths[sink], self._schema, options=options)
+        self._sinks[sink].write_table(table)
+        self.rows[sink] += table.num_rows
@@ -0,0 +1,130 @@
+import hashlib
+import os
+import pickle
+import shutil
+import tempfile
+from typing import Dict, Iterable, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .columns import decode_column, encode_column
+
+# Sources whose changes can alter the parsed frame or a feature value; any
+# edit to them changes the cache key, so stale entries are never served
+FEATURE_CODE = ["anomaly_model.py", "features.py", "feature_store.py", "global_stats.py", "ip_addresses.py",
+                "segments.py"]
+# Bump when the on-disk entry layout changes
+CACHE_FORMAT = 1
+
+
+def _code_version() -> str:
+    digest = hashlib.sha256(f"{CACHE_FORMAT}:{pd.__version__}:{np.__version__}".encode())
+    here = os.path.dirname(os.path.abspath(__file__))
+    for name in FEATURE_CODE:
+        with open(os.path.join(here, name), "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def file_digest(filepath: str, block_size: int = 2 ** 20) -> str:
+    digest = hashlib.sha256()
+    with open(filepath, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class FeatureCache:
+    """
+    On-disk cache of load_and_preprocess + engineer_features results, keyed by
+    the file's contents, the feature code version and the feature options.
+
+    Every column is stored as its own .npy file (text as codes plus distinct
+    values, see columns.py) and memory-mapped copy-on-write when read back,
+    so a hit costs a hash of the file and little else. Entries are evicted
+    least recently used first once the cache grows past max_size_mb.
+    """
+
+    def __init__(self, cache_dir: str, max_size_mb: int = 2048):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_size_mb * 2 ** 20
+        self.version = _code_version()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def key(self, filepath: str, names: Optional[Iterable[str]] = None, compact: bool = False,
+            vocabularies: Optional[Dict[str, np.ndarray]] = None) -> str:
+        options = f"{self.version}:{compact}:{None if names is None else sorted(set(names))}"
+        if vocabularies:
+            # A trained detector's category codes follow its own vocabularies
+            options += ":" + hashlib.sha256(pickle.dumps(sorted(
+                (col, list(values)) for col, values in vocabularies.items()))).hexdigest()
+        return hashlib.sha256(f"{file_digest(filepath)}:{options}".encode()).hexdigest()
+
+    def get(self, key: str) -> Optional[Tuple[pd.DataFrame, pd.DataFrame]]:
+        entry = os.path.join(self.cache_dir, key)
+        try:
+            with open(os.path.join(entry, "meta.pkl"), "rb") as f:
+                meta = pickle.load(f)
+            frames = tuple(self._read_frame(entry, part, meta[part]) for part in ("frame", "features"))
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+        os.utime(entry)  # the entry's mtime is its last use, for LRU eviction
+        return frames
+
+    def put(self, key: str, df: pd.DataFrame, features: pd.DataFrame) -> None:
+        entry = os.path.join(self.cache_dir, key)
+        if os.path.isdir(entry):
+            return
+        # Written to a scratch directory and renamed into place, so readers
+        # never see a partial entry
+        scratch = tempfile.mkdtemp(prefix=f".{key}-", dir=self.cache_dir)
+        try:
+            meta = {"frame": self._write_frame(scratch, "frame", df),
+                    "features": self._write_frame(scratch, "features", features)}
+            with open(os.path.join(scratch, "meta.pkl"), "wb") as f:
+                pickle.dump(meta, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.rename(scratch, entry)
+        except OSError:
+            shutil.rmtree(scratch, ignore_errors=True)
+            if not os.path.isdir(entry):
+                raise
+        self.evict()
+
+    def evict(self) -> None:
+        entries = []
+        for item in os.scandir(self.cache_dir):
+            if item.is_dir() and not item.name.startswith("."):
+                size = sum(f.stat().st_size for f in os.scandir(item.path) if f.is_file())
+                entries.append((item.stat().st_mtime, size, item.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+
+    def clear(self) -> None:
+        for item in os.scandir(self.cache_dir):
+            if item.is_dir():
+                shutil.rmtree(item.path, ignore_errors=True)
+
+    @staticmethod
+    def _write_frame(entry: str, part: str, df: pd.DataFrame) -> dict:
+        columns = []
+        for i, col in enumerate(df.columns):
+            kind, data, values = encode_column(df[col])
+            np.save(os.path.join(entry, f"{part}_{i}.npy"), data)
+            columns.append((col, kind, values))
+        np.save(os.path.join(entry, f"{part}_index.npy"), df.index.to_numpy())
+        return {"columns": columns, "index_name": df.index.name}
+
+    @staticmethod
+    def _read_frame(entry: str, part: str, meta: dict) -> pd.DataFrame:
+        columns = {}
+        for i, (col, kind, values) in enumerate(meta["columns"]):
+            # A plain ndarray view; the mapping stays open through its base
+            data = np.load(os.path.join(entry, f"{part}_{i}.npy"), mmap_mode="c").view(np.ndarray)
+            columns[col] = decode_column(kind, data, values)
+        index = pd.Index(np.load(os.path.join(entry, f"{part}_index.npy")), name=meta["index_name"])
+        return pd.DataFrame(columns, index=index, copy=False)
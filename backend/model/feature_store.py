@@ -0,0 +1,275 @@
+import pickle
+from typing import Dict, Iterable, Optional
+
+import numpy as np
+import pandas as pd
+
+from .moments import merge_moments
+from .segments import GroupIndex, VELOCITY_WINDOWS, velocity_features
+
+ROLLING_WINDOW = 10
+FIRST_TXN_INTERVAL = 86400
+
+# Which (user, entity) statistics each optional column feeds
+ENTITY_STATS = {
+    "merchant_category": ["pair_count"],
+    "merchant_id": ["pair_count"],
+    "country": ["pair_count"],
+    "device_id": ["first_seen", "nunique", "users"],
+    "browser_fingerprint": ["first_seen"],
+    "ip_key": ["first_seen", "nunique", "users"],
+    "ip_subnet": ["users"],
+}
+
+
+WINDOW_KEYS = [f"{kind}_{w}" for w in VELOCITY_WINDOWS for kind in ("txn_count", "amount_sum")] + [
+    "rolling_mean_10", "rolling_std_10"]
+
+
+def user_behavior(df: pd.DataFrame, users: GroupIndex,
+                  keys: Optional[Iterable[str]] = None) -> Dict[str, np.ndarray]:
+    """
+    Per-user primitives for a frame sorted by user and time, computed from the
+    frame alone. `UserFeatureStore.update` returns the same keys from history.
+    Pass `keys` to compute only those primitives.
+    """
+    keys = None if keys is None else set(keys)
+
+    def wanted(*names):
+        return keys is None or any(name in keys for name in names)
+
+    amount = df["transaction_amount"].to_numpy(dtype=np.float64)
+    times = df["transaction_time"].to_numpy(dtype="datetime64[ns]")
+    out = {}
+
+    if wanted("user_txn_count"):
+        out["user_txn_count"] = users.cumcount() + 1
+    for key, stat in [("user_mean", users.mean), ("user_std", users.std), ("user_max", users.max),
+                      ("user_min", users.min), ("user_median", users.median)]:
+        if wanted(key):
+            out[key] = users.broadcast(stat(amount))
+
+    if wanted("time_since_last", "avg_txn_interval"):
+        time_since_last = np.nan_to_num(users.diff(times.view("i8")) / 1e9, nan=FIRST_TXN_INTERVAL)
+        out["time_since_last"] = time_since_last
+        out["avg_txn_interval"] = users.broadcast(users.mean(time_since_last))
+
+    if {"latitude", "longitude"}.issubset(df.columns):
+        for axis, col in [("lat", "latitude"), ("lon", "longitude")]:
+            if wanted(f"{axis}_shift", f"{axis}_std"):
+                coords = df[col].to_numpy(dtype=np.float64)
+                out[f"{axis}_shift"] = users.shift(coords)
+                out[f"{axis}_std"] = users.broadcast(users.std(coords))
+
+    for col, stats in ENTITY_STATS.items():
+        if col not in df.columns or not wanted(*(f"{col}_{stat}" for stat in stats)):
+            continue
+        values = df[col]
+        if "pair_count" in stats and wanted(f"{col}_pair_count"):
+            out[f"{col}_pair_count"] = users.pair_cumcount(values) + 1
+        if "first_seen" in stats and wanted(f"{col}_first_seen"):
+            out[f"{col}_first_seen"] = users.first_occurrence(values)
+        if "nunique" in stats and wanted(f"{col}_nunique"):
+            out[f"{col}_nunique"] = users.broadcast(users.nunique(values))
+        if "users" in stats and wanted(f"{col}_users"):
+            out[f"{col}_users"] = users.users_per_value(values)
+
+    if wanted(*WINDOW_KEYS[:-2]):
+        out.update(velocity_features(users, times, amount))
+    if wanted("rolling_mean_10", "rolling_std_10"):
+        out["rolling_mean_10"], out["rolling_std_10"] = users.rolling_mean_std(amount, window=ROLLING_WINDOW)
+    return out
+
+
+def _missing_to_none(values: np.ndarray) -> list:
+    return [None if pd.isna(v) else v for v in values]
+
+
+class UserFeatureStore:
+    """
+    Persistent per-user state so a new batch can be featurized in O(batch size).
+
+    Holds running counts, Welford mean/M2 and min/max of amounts, first and
+    last timestamps, the last location, (user, entity) counters and a buffer
+    of each user's recent transactions for the velocity and rolling windows.
+    Batches must arrive in time order per user. The per-user median is not
+    mergeable, so `user_median` is still taken from the batch alone.
+    """
+
+    SCALARS = {
+        "count": np.int64, "mean": np.float64, "m2": np.float64, "min": np.float64, "max": np.float64,
+        "first_ts": np.int64, "last_ts": np.int64, "last_lat": np.float64, "last_lon": np.float64,
+        "lat_n": np.int64, "lat_mean": np.float64, "lat_m2": np.float64,
+        "lon_n": np.int64, "lon_mean": np.float64, "lon_m2": np.float64,
+    }
+
+    def __init__(self):
+        self.slots: Dict = {}
+        self.state = {name: np.zeros(0, dtype=dtype) for name, dtype in self.SCALARS.items()}
+        self.pair_counts = {col: {} for col in ENTITY_STATS}
+        self.distinct_per_user = {col: {} for col in ENTITY_STATS}
+        self.users_per_value = {col: {} for col in ENTITY_STATS}
+        self.buffers: Dict = {}
+        self.buffer_span = max(pd.Timedelta(w.lower()).value for w in VELOCITY_WINDOWS)
+
+    def __len__(self) -> int:
+        return len(self.slots)
+
+    def _assign_slots(self, user_ids: np.ndarray) -> np.ndarray:
+        slots = np.array([self.slots.setdefault(u, len(self.slots)) for u in user_ids], dtype=np.int64)
+        capacity = len(self.state["count"])
+        if len(self.slots) > capacity:
+            grow = max(len(self.slots), 2 * capacity) - capacity
+            for name, dtype in self.SCALARS.items():
+                fill = np.nan if name in ("last_lat", "last_lon") else 0
+                self.state[name] = np.concatenate([self.state[name], np.full(grow, fill, dtype=dtype)])
+        return slots
+
+    @staticmethod
+    def _merge_moments(n_a, mean_a, m2_a, n_b, mean_b, m2_b):
+        # Welford's running mean and M2 per user, with no NaN left for users without values
+        n, mean, m2 = merge_moments(n_a, mean_a, m2_a, n_b, mean_b, m2_b)
+        return n, np.nan_to_num(mean), np.nan_to_num(m2)
+
+    @staticmethod
+    def _std(n, m2):
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(n > 1, np.sqrt(m2 / (n - 1)), np.nan)
+
+    def update(self, df: pd.DataFrame) -> Dict[str, np.ndarray]:
+        """Fold a batch sorted by user and time into the state and return its primitives."""
+        users = GroupIndex(df["user_id"].to_numpy())
+        if users.n == 0:
+            return user_behavior(df, users)
+        out = user_behavior(df, users, keys=["user_median", "time_since_last", "lat_shift", "lon_shift"])
+
+        user_ids = df["user_id"].to_numpy()[users.starts]
+        known = np.array([u in self.slots for u in user_ids])
+        slots = self._assign_slots(user_ids)
+        s = {name: values[slots] for name, values in self.state.items()}
+
+        amount = df["transaction_amount"].to_numpy(dtype=np.float64)
+        times = df["transaction_time"].to_numpy(dtype="datetime64[ns]").view("i8")
+
+        # Amount moments
+        batch_mean = users.mean(amount)
+        batch_m2 = users._reduce(np.add, (amount - users.broadcast(batch_mean)) ** 2)
+        count, mean, m2 = self._merge_moments(s["count"], s["mean"], s["m2"], users.sizes, batch_mean, batch_m2)
+        low = np.where(known, np.fmin(s["min"], users.min(amount)), users.min(amount))
+        high = np.where(known, np.fmax(s["max"], users.max(amount)), users.max(amount))
+
+        out["user_txn_count"] = users.broadcast(s["count"]) + users.positions + 1
+        out["user_mean"] = users.broadcast(mean)
+        out["user_std"] = users.broadcast(self._std(count, m2))
+        out["user_max"] = users.broadcast(high)
+        out["user_min"] = users.broadcast(low)
+
+        # Intervals: the sum over a user's history telescopes to first/last timestamps
+        first_rows = users.starts
+        since_last = out["time_since_last"]
+        since_last[first_rows] = np.where(known, (times[first_rows] - s["last_ts"]) / 1e9, FIRST_TXN_INTERVAL)
+        first_ts = np.where(known, s["first_ts"], times[first_rows])
+        last_ts = times[first_rows + users.sizes - 1]
+        out["avg_txn_interval"] = users.broadcast((FIRST_TXN_INTERVAL + (last_ts - first_ts) / 1e9) / count)
+
+        new_state = {"count": count, "mean": mean, "m2": m2, "min": low, "max": high,
+                     "first_ts": first_ts, "last_ts": last_ts}
+
+        if "lat_shift" in out:
+            for axis, col in [("lat", "latitude"), ("lon", "longitude")]:
+                coords = df[col].to_numpy(dtype=np.float64)
+                out[f"{axis}_shift"][first_rows] = np.where(known, s[f"last_{axis}"], np.nan)
+                valid = ~np.isnan(coords)
+                n_b = users._reduce(np.add, valid)
+                mean_b = np.nan_to_num(users.mean(coords))
+                m2_b = users._reduce(np.add, np.where(valid, coords - users.broadcast(mean_b), 0) ** 2)
+                n, mean_c, m2_c = self._merge_moments(s[f"{axis}_n"], s[f"{axis}_mean"], s[f"{axis}_m2"],
+                                                      n_b, mean_b, m2_b)
+                out[f"{axis}_std"] = users.broadcast(self._std(n, m2_c))
+                new_state.update({f"last_{axis}": coords[first_rows + users.sizes - 1],
+                                  f"{axis}_n": n, f"{axis}_mean": mean_c, f"{axis}_m2": m2_c})
+
+        for col in ENTITY_STATS:
+            if col in df.columns:
+                self._update_entities(df[col], users, user_ids, out, col)
+
+        self._update_windows(users, user_ids, known, times, amount, out)
+
+        for name, values in new_state.items():
+            self.state[name][slots] = values
+        return out
+
+    def _update_entities(self, values, users, user_ids, out, col):
+        counts = self.pair_counts[col]
+        distinct = self.distinct_per_user[col]
+        users_per_value = self.users_per_value[col]
+
+        pair_codes, _ = users._pairs(values)
+        pair_ids, first_rows = np.unique(pair_codes, return_index=True)
+        pair_of_row = np.searchsorted(pair_ids, pair_codes)
+        batch_counts = np.bincount(pair_of_row)
+
+        keys = list(zip(user_ids[users.codes[first_rows]], _missing_to_none(values.to_numpy(dtype=object)[first_rows])))
+        prior = np.array([counts.get(key, 0) for key in keys], dtype=np.int64)
+        new_pair = prior == 0
+
+        out[f"{col}_first_seen"] = (users.first_occurrence(values) & new_pair[pair_of_row])
+        running = users.pair_cumcount(values) + 1
+        out[f"{col}_pair_count"] = running + prior[pair_of_row]
+
+        for key, n, is_new in zip(keys, batch_counts, new_pair):
+            counts[key] = counts.get(key, 0) + int(n)
+            if is_new and key[1] is not None:
+                distinct[key[0]] = distinct.get(key[0], 0) + 1
+                users_per_value[key[1]] = users_per_value.get(key[1], 0) + 1
+
+        out[f"{col}_nunique"] = np.array([distinct.get(u, 0) for u in user_ids], dtype=np.int64)[users.codes]
+        row_values = _missing_to_none(values)
+        out[f"{col}_users"] = np.array(
+            [np.nan if v is None else users_per_value[v] for v in row_values], dtype=np.float64
+        )
+
+    def _update_windows(self, users, user_ids, known, times, amount, out):
+        # Replay each user's buffered recent rows ahead of the batch so the
+        # velocity windows and rolling stats see the same history as a full run.
+        empty = (np.empty(0, dtype=np.int64), np.empty(0))
+        history = [self.buffers.get(u, empty) if k else empty for u, k in zip(user_ids, known)]
+        hist_sizes = np.array([len(h[0]) for h in history], dtype=np.int64)
+
+        sizes = hist_sizes + users.sizes
+        combined_starts = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+        group = np.repeat(np.arange(users.n_groups), sizes)
+        is_batch = np.arange(len(group)) - combined_starts[group] >= hist_sizes[group]
+
+        combined_t = np.empty(len(group), dtype=np.int64)
+        combined_amount = np.empty(len(group))
+        combined_t[is_batch], combined_amount[is_batch] = times, amount
+        if hist_sizes.sum():
+            combined_t[~is_batch] = np.concatenate([h[0] for h in history])
+            combined_amount[~is_batch] = np.concatenate([h[1] for h in history])
+
+        combined = GroupIndex(group)
+        velocity = velocity_features(combined, combined_t.view("datetime64[ns]"), combined_amount)
+        for name, values in velocity.items():
+            out[name] = values[is_batch]
+        rolling_mean, rolling_std = combined.rolling_mean_std(combined_amount, window=ROLLING_WINDOW)
+        out["rolling_mean_10"], out["rolling_std_10"] = rolling_mean[is_batch], rolling_std[is_batch]
+
+        last_t = combined_t[combined_starts + sizes - 1]
+        from_end = combined_starts[group] + sizes[group] - 1 - np.arange(len(group))
+        keep = (combined_t > last_t[group] - self.buffer_span) | (from_end < ROLLING_WINDOW - 1)
+        bounds = np.cumsum(np.bincount(group[keep], minlength=users.n_groups))[:-1]
+        for user, t, a in zip(user_ids, np.split(combined_t[keep], bounds), np.split(combined_amount[keep], bounds)):
+            self.buffers[user] = (t, a)
+
+    def save(self, path: str) -> None:
+        with open(path, "wb") as f:
+            pickle.dump(self.__dict__, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def load(cls, path: str) -> "UserFeatureStore":
+        store = cls.__new__(cls)
+        with open(path, "rb") as f:
+            store.__dict__.update(pickle.load(f))
+        return store
+
@@ -0,0 +1,416 @@
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+from typing import Callable, Dict, Iterable, List, Optional, Set
+
+from .feature_store import UserFeatureStore, user_behavior
+from .global_stats import GlobalStats
+from .ip_addresses import ip_entropy, pair_keys
+from .segments import GroupIndex, VELOCITY_WINDOWS
+
+# Every batch has these; all features implicitly read them
+BASE_COLUMNS = ["user_id", "transaction_time", "transaction_amount"]
+
+# Storage type of each feature kind in compact mode; category codes keep
+# the minimal integer type pandas already gives them.
+COMPACT_DTYPES = {"flag": np.int8, "count": np.int32, "continuous": np.float32}
+
+
+class FeatureSpec:
+    """A registered feature and everything it reads."""
+
+    def __init__(self, name: str, func: Callable, inputs: Iterable[str] = (), optional: Iterable[str] = (),
+                 deps: Iterable[str] = (), behavior: Iterable[str] = (), kind: str = "continuous",
+                 cross_user: bool = False):
+        self.name = name
+        self.func = func
+        self.kind = kind                # "flag", "count", "code" or "continuous"
+        self.cross_user = cross_user    # reads other users' rows, so needs the whole batch
+        self.inputs = list(inputs)      # raw columns; the feature is skipped when one is missing
+        self.optional = list(optional)  # raw columns read only when present
+        self.deps = list(deps)          # other registered features
+        self.behavior = list(behavior)  # per-user primitives from feature_store.user_behavior
+
+
+FEATURES: Dict[str, FeatureSpec] = {}
+
+
+def register(name: str, func: Callable, inputs: Iterable[str] = (), optional: Iterable[str] = (),
+             deps: Iterable[str] = (), behavior: Iterable[str] = (), kind: str = "continuous",
+             cross_user: bool = False) -> None:
+    missing = [dep for dep in deps if dep not in FEATURES]
+    if missing:
+        raise ValueError(f"{name} depends on unregistered features {missing}")
+    FEATURES[name] = FeatureSpec(name, func, inputs, optional, deps, behavior, kind, cross_user)
+
+
+class FeatureContext:
+    """
+    Values computed so far for one batch, plus shared per-user primitives.
+    With `stats`, cross-user features use whole-dataset statistics instead
+    of the batch's own; with `vocabularies`, category codes follow the given
+    categories (a trained model's) instead of the batch's.
+    """
+
+    def __init__(self, df: pd.DataFrame, stats: Optional[GlobalStats] = None,
+                 vocabularies: Optional[Dict[str, np.ndarray]] = None):
+        self.df = df
+        self.stats = stats
+        self.vocabularies = vocabularies or {}
+        self.values: Dict[str, object] = {}
+        self.behavior: Dict[str, np.ndarray] = {}
+
+    @property
+    def n_rows(self) -> int:
+        return len(self.df) if self.stats is None else self.stats.n
+
+    def __getitem__(self, name: str):
+        return self.values[name]
+
+    def column_or_zero(self, col: str) -> pd.Series:
+        if col in self.df.columns:
+            return self.df[col].fillna(0)
+        return pd.Series(0, index=self.df.index)
+
+
+def closure(names: Iterable[str]) -> Set[str]:
+    """The requested features plus everything they depend on."""
+    needed, stack = set(), list(names)
+    while stack:
+        name = stack.pop()
+        if name in needed or name not in FEATURES:
+            continue
+        needed.add(name)
+        stack.extend(FEATURES[name].deps)
+    return needed
+
+
+def plan(names: Optional[Iterable[str]], columns: Iterable[str]) -> List[FeatureSpec]:
+    """Features to compute, in registration (and therefore dependency) order."""
+    needed = closure(FEATURES if names is None else names)
+    columns = set(columns)
+    available: Set[str] = set()
+    for name, spec in FEATURES.items():
+        if name in needed and set(spec.inputs) <= columns and set(spec.deps) <= available:
+            available.add(name)
+    return [FEATURES[name] for name in FEATURES if name in available]
+
+
+def cross_user_features() -> Set[str]:
+    """Features that read other users' rows, and everything derived from them."""
+    found: Set[str] = set()
+    for name, spec in FEATURES.items():
+        if spec.cross_user or any(dep in found for dep in spec.deps):
+            found.add(name)
+    return found
+
+
+def required_columns(names: Optional[Iterable[str]] = None) -> Set[str]:
+    """Raw columns needed to compute `names` (all features when None)."""
+    columns = set(BASE_COLUMNS)
+    for name in closure(FEATURES if names is None else names):
+        columns.update(FEATURES[name].inputs)
+        columns.update(FEATURES[name].optional)
+    return columns
+
+
+def category_vocabularies(df: pd.DataFrame, stats: Optional[GlobalStats] = None) -> Dict[str, np.ndarray]:
+    """The sorted categories each code feature encodes against, from the batch or from whole-file `stats`."""
+    vocabularies = {}
+    for spec in FEATURES.values():
+        if spec.kind == "code" and set(spec.inputs) <= set(df.columns):
+            col = spec.inputs[0]
+            categories = stats.counts[col].index.sort_values() if stats is not None else \
+                pd.Categorical(df[col]).categories
+            vocabularies[col] = np.asarray(categories)
+    return vocabularies
+
+
+def _compact(values, kind: str):
+    """Store a column in its kind's compact dtype, with NaN/inf filled as engineer_features does."""
+    dtype = COMPACT_DTYPES.get(kind)
+    if dtype is None:
+        return values
+    values = np.asarray(values)
+    if values.dtype.kind == "f":
+        values = np.nan_to_num(values.astype(np.float32, copy=False), nan=0, posinf=0, neginf=0)
+    return values.astype(dtype, copy=False)
+
+
+def compute_features(df: pd.DataFrame, names: Optional[Iterable[str]] = None,
+                     state: Optional[UserFeatureStore] = None, compact: bool = False,
+                     stats: Optional[GlobalStats] = None,
+                     vocabularies: Optional[Dict[str, np.ndarray]] = None) -> pd.DataFrame:
+    """
+    Compute the requested features (all when None) and only what they need.
+    With a state store, per-user primitives come from the batch folded into it;
+    with global stats, cross-user features describe the whole dataset; with
+    vocabularies, category codes are taken against them.
+    In compact mode each emitted column is stored in its kind's narrow dtype
+    and intermediates are released as soon as nothing else reads them.
+    """
+    names = None if names is None else list(names)
+    steps = plan(names, df.columns)
+    ctx = FeatureContext(df, stats, vocabularies)
+
+    if state is not None:
+        ctx.behavior = state.update(df)
+    else:
+        keys = {key for spec in steps for key in spec.behavior}
+        if keys:
+            ctx.behavior = user_behavior(df, GroupIndex(df["user_id"].to_numpy()), keys)
+
+    requested = set(FEATURES if names is None else names)
+    readers = Counter(dep for spec in steps for dep in spec.deps)
+    behavior_readers = Counter(key for spec in steps for key in spec.behavior)
+    columns = {}
+    for spec in steps:
+        value = spec.func(ctx)
+        if compact and spec.kind == "continuous":
+            value = np.asarray(value, dtype=np.float32)
+        ctx.values[spec.name] = value
+        if spec.name in requested:
+            columns[spec.name] = _compact(value, spec.kind) if compact else value
+
+        if compact:
+            for dep in spec.deps + [spec.name]:
+                readers[dep] -= dep != spec.name
+                if readers[dep] <= 0:
+                    ctx.values.pop(dep, None)
+            for key in spec.behavior:
+                behavior_readers[key] -= 1
+                if behavior_readers[key] == 0:
+                    ctx.behavior.pop(key, None)
+
+    return pd.DataFrame(columns, index=df.index)
+
+
+def haversine_distance(lat1, lon1, lat2, lon2):
+    R = 6371
+    lat1, lon1, lat2, lon2 = map(np.radians, [lat1, lon1, lat2, lon2])
+    dlat = lat2 - lat1
+    dlon = lon2 - lon1
+    a = np.sin(dlat/2)**2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlon/2)**2
+    c = 2 * np.arcsin(np.sqrt(a))
+    return R * c
+
+
+def _frequency(col: str) -> Callable:
+    # value_counts + map, via integer codes so Categorical columns work too
+    def frequency(c: FeatureContext) -> np.ndarray:
+        if c.stats is not None:
+            return c.stats.frequency(col, c.df[col])
+        codes, _ = pd.factorize(c.df[col])
+        counts = np.bincount(codes[codes >= 0]).astype(np.float64)
+        return np.where(codes >= 0, counts[codes] if len(counts) else 0, np.nan)
+    return frequency
+
+
+def _encoded(col: str) -> Callable:
+    def encoded(c: FeatureContext) -> np.ndarray:
+        if col in c.vocabularies:
+            return pd.Categorical(c.df[col], categories=c.vocabularies[col]).codes
+        if c.stats is not None:
+            return c.stats.codes(col, c.df[col])
+        return pd.Categorical(c.df[col]).codes
+    return encoded
+
+
+def _users(col: str) -> Callable:
+    def users(c: FeatureContext) -> np.ndarray:
+        if c.stats is not None:
+            return c.stats.users_per_value(col, c.df[col])
+        return c.behavior[f"{col}_users"]
+    return users
+
+
+def _amount_zscore(c: FeatureContext) -> pd.Series:
+    amount = c.df["transaction_amount"]
+    if c.stats is not None:
+        return (amount - c.stats.amount.mean) / (c.stats.amount.std + 1e-6)
+    return (amount - amount.mean()) / (amount.std() + 1e-6)
+
+
+def _amount_percentile(c: FeatureContext):
+    if c.stats is not None:
+        return c.stats.amount_ranks.rank_pct(c.df["transaction_amount"])
+    return c.df["transaction_amount"].rank(pct=True)
+
+
+def _flag(dep: str, test: Callable) -> Callable:
+    return lambda c: test(c[dep]).astype(int)
+
+
+def _behavior(key: str) -> Callable:
+    return lambda c: c.behavior[key]
+
+
+# Transaction Amount Features
+register("amount", lambda c: c.df["transaction_amount"])
+register("log_amount", lambda c: np.log1p(c.df["transaction_amount"]))
+register("sqrt_amount", lambda c: np.sqrt(c.df["transaction_amount"]))
+register("amount_squared", lambda c: c.df["transaction_amount"] ** 2)
+register("amount_vs_user_median",
+         lambda c: (c.df["transaction_amount"] - c.behavior["user_median"]) / (c.behavior["user_std"] + 1e-6),
+         behavior=["user_median", "user_std"])
+register("amount_vs_user_max", lambda c: c.df["transaction_amount"] / (c.behavior["user_max"] + 1e-6),
+         behavior=["user_max"])
+register("amount_zscore", _amount_zscore, cross_user=True)
+register("amount_percentile", _amount_percentile, cross_user=True)
+
+# Temporal Features
+register("hour", lambda c: c.df["transaction_time"].dt.hour, kind="count")
+register("day_of_week", lambda c: c.df["transaction_time"].dt.dayofweek, kind="count")
+register("day_of_month", lambda c: c.df["transaction_time"].dt.day, kind="count")
+register("month", lambda c: c.df["transaction_time"].dt.month, kind="count")
+register("is_weekend", _flag("day_of_week", lambda day: day >= 5), deps=["day_of_week"], kind="flag")
+register("is_night", _flag("hour", lambda hour: (hour >= 23) | (hour <= 5)), deps=["hour"], kind="flag")
+register("is_business_hours", _flag("hour", lambda hour: (hour >= 9) & (hour <= 17)), deps=["hour"], kind="flag")
+register("hour_sin", lambda c: np.sin(2 * np.pi * c["hour"] / 24), deps=["hour"])
+register("hour_cos", lambda c: np.cos(2 * np.pi * c["hour"] / 24), deps=["hour"])
+register("day_sin", lambda c: np.sin(2 * np.pi * c["day_of_week"] / 7), deps=["day_of_week"])
+register("day_cos", lambda c: np.cos(2 * np.pi * c["day_of_week"] / 7), deps=["day_of_week"])
+
+# Velocity Features
+for window in VELOCITY_WINDOWS:
+    for prefix in ["txn_count", "amount_sum"]:
+        register(f"{prefix}_{window}", _behavior(f"{prefix}_{window}"), behavior=[f"{prefix}_{window}"],
+                 kind="count" if prefix == "txn_count" else "continuous")
+
+register("seconds_since_last_txn", _behavior("time_since_last"), behavior=["time_since_last"])
+register("log_time_since_last", lambda c: np.log1p(c["seconds_since_last_txn"]), deps=["seconds_since_last_txn"])
+register("avg_txn_interval", _behavior("avg_txn_interval"), behavior=["avg_txn_interval"])
+register("time_deviation_from_pattern",
+         lambda c: (c["seconds_since_last_txn"] - c["avg_txn_interval"]) / (c["avg_txn_interval"] + 1e-6),
+         deps=["seconds_since_last_txn", "avg_txn_interval"])
+
+# User Behavior Profiling
+register("user_txn_count", _behavior("user_txn_count"), behavior=["user_txn_count"], kind="count")
+register("is_first_transaction", _flag("user_txn_count", lambda count: count == 1), deps=["user_txn_count"],
+         kind="flag")
+register("user_avg_amount", _behavior("user_mean"), behavior=["user_mean"])
+register("user_std_amount", lambda c: np.nan_to_num(c.behavior["user_std"]), behavior=["user_std"])
+register("user_max_amount", _behavior("user_max"), behavior=["user_max"])
+register("user_min_amount", _behavior("user_min"), behavior=["user_min"])
+register("amount_deviation_from_user",
+         lambda c: (c.df["transaction_amount"] - c["user_avg_amount"]) / (c["user_std_amount"] + 1e-6),
+         deps=["user_avg_amount", "user_std_amount"])
+
+# Merchant & Category Features
+register("merchant_category_freq", _frequency("merchant_category"), inputs=["merchant_category"],
+         kind="count", cross_user=True)
+register("merchant_category_freq_normalized", lambda c: c["merchant_category_freq"] / c.n_rows,
+         deps=["merchant_category_freq"])
+register("user_category_count", _behavior("merchant_category_pair_count"), inputs=["merchant_category"],
+         behavior=["merchant_category_pair_count"], kind="count")
+register("is_new_category_for_user", _flag("user_category_count", lambda count: count == 1),
+         deps=["user_category_count"], kind="flag")
+register("merchant_category_encoded", _encoded("merchant_category"), inputs=["merchant_category"],
+         kind="code", cross_user=True)
+
+register("merchant_id_freq", _frequency("merchant_id"), inputs=["merchant_id"], kind="count", cross_user=True)
+register("is_rare_merchant", _flag("merchant_id_freq", lambda freq: freq < 10), deps=["merchant_id_freq"], kind="flag")
+register("user_merchant_count", _behavior("merchant_id_pair_count"), inputs=["merchant_id"],
+         behavior=["merchant_id_pair_count"], kind="count")
+register("is_new_merchant_for_user", _flag("user_merchant_count", lambda count: count == 1),
+         deps=["user_merchant_count"], kind="flag")
+
+# Geographic Features
+register("country_freq", _frequency("country"), inputs=["country"], kind="count", cross_user=True)
+register("is_rare_country", _flag("country_freq", lambda freq: freq < 50), deps=["country_freq"], kind="flag")
+register("country_encoded", _encoded("country"), inputs=["country"], kind="code", cross_user=True)
+register("user_country_count", _behavior("country_pair_count"), inputs=["country"], behavior=["country_pair_count"],
+         kind="count")
+register("is_new_country_for_user", _flag("user_country_count", lambda count: count == 1),
+         deps=["user_country_count"], kind="flag")
+register("location_region_encoded", _encoded("location_region"), inputs=["location_region"],
+         kind="code", cross_user=True)
+
+register("geo_distance_km",
+         lambda c: np.nan_to_num(haversine_distance(c.df["latitude"], c.df["longitude"],
+                                                    c.behavior["lat_shift"], c.behavior["lon_shift"])),
+         inputs=["latitude", "longitude"], behavior=["lat_shift", "lon_shift"])
+register("implied_speed_kmh",
+         lambda c: c["geo_distance_km"] / (c.behavior["time_since_last"] / 3600 + 1e-6),
+         deps=["geo_distance_km"], behavior=["time_since_last"])
+register("is_impossible_travel", _flag("implied_speed_kmh", lambda speed: speed > 900), deps=["implied_speed_kmh"],
+         kind="flag")
+register("lat_std", lambda c: np.nan_to_num(c.behavior["lat_std"]), inputs=["latitude", "longitude"],
+         behavior=["lat_std"])
+register("lon_std", lambda c: np.nan_to_num(c.behavior["lon_std"]), inputs=["latitude", "longitude"],
+         behavior=["lon_std"])
+register("geo_entropy", lambda c: np.sqrt(c["lat_std"]**2 + c["lon_std"]**2), deps=["lat_std", "lon_std"])
+
+# Device & Session Features
+register("device_freq", _frequency("device_id"), inputs=["device_id"], kind="count", cross_user=True)
+register("is_rare_device", _flag("device_freq", lambda freq: freq < 5), deps=["device_freq"], kind="flag")
+register("device_change", lambda c: c.behavior["device_id_first_seen"].astype(int), inputs=["device_id"],
+         behavior=["device_id_first_seen"], kind="flag")
+register("user_device_count", _behavior("device_id_nunique"), inputs=["device_id"], behavior=["device_id_nunique"],
+         kind="count")
+register("is_multi_device_user", _flag("user_device_count", lambda count: count > 3), deps=["user_device_count"],
+         kind="flag")
+register("browser_change", lambda c: c.behavior["browser_fingerprint_first_seen"].astype(int),
+         inputs=["browser_fingerprint"], behavior=["browser_fingerprint_first_seen"], kind="flag")
+
+# IP Address Features
+register("ip_entropy", lambda c: ip_entropy(c.df["ip_address"]), inputs=["ip_address"], kind="count")
+register("ip_freq", _frequency("ip_key"), inputs=["ip_key"], kind="count", cross_user=True)
+register("is_rare_ip", _flag("ip_freq", lambda freq: freq < 5), deps=["ip_freq"], kind="flag")
+register("user_ip_count", _behavior("ip_key_nunique"), inputs=["ip_key"], behavior=["ip_key_nunique"],
+         kind="count")
+register("is_new_ip_for_user", lambda c: c.behavior["ip_key_first_seen"].astype(int), inputs=["ip_key"],
+         behavior=["ip_key_first_seen"], kind="flag")
+register("users_per_ip", _users("ip_key"), inputs=["ip_key"], behavior=["ip_key_users"],
+         kind="count", cross_user=True)
+register("is_shared_ip", _flag("users_per_ip", lambda users: users > 5), deps=["users_per_ip"], kind="flag")
+register("ip_subnet_freq", _frequency("ip_subnet"), inputs=["ip_subnet"], kind="count", cross_user=True)
+register("users_per_subnet", _users("ip_subnet"), inputs=["ip_subnet"], behavior=["ip_subnet_users"],
+         kind="count", cross_user=True)
+
+# Security Indicators
+register("failed_login_attempts", lambda c: c.column_or_zero("failed_login_attempts"),
+         optional=["failed_login_attempts"], kind="count")
+register("has_failed_logins", _flag("failed_login_attempts", lambda attempts: attempts > 0),
+         deps=["failed_login_attempts"], kind="flag")
+register("high_failed_logins", _flag("failed_login_attempts", lambda attempts: attempts >= 3),
+         deps=["failed_login_attempts"], kind="flag")
+register("profile_updated", lambda c: c.column_or_zero("profile_updated").astype(int), optional=["profile_updated"],
+         kind="flag")
+register("is_new_payee", lambda c: c.column_or_zero("is_new_payee").astype(int), optional=["is_new_payee"],
+         kind="flag")
+
+# Transaction Channel & Card Features
+register("channel_encoded", _encoded("transaction_channel"), inputs=["transaction_channel"],
+         kind="code", cross_user=True)
+register("channel_freq", _frequency("transaction_channel"), inputs=["transaction_channel"],
+         kind="count", cross_user=True)
+register("card_not_present",
+         lambda c: (c.df["is_card_present"] == 0).astype(int) if "is_card_present" in c.df.columns else 0,
+         optional=["is_card_present"], kind="flag")
+register("currency_encoded", _encoded("currency"), inputs=["currency"], kind="code", cross_user=True)
+register("is_foreign_currency", lambda c: (c.df["currency"].astype(str) != c.df["country"].astype(str)).astype(int),
+         inputs=["currency", "country"], kind="flag")
+
+# Network Analysis Features
+register("device_user_network_size", _users("device_id"), inputs=["device_id"], behavior=["device_id_users"],
+         kind="count", cross_user=True)
+register("is_device_shared", _flag("device_user_network_size", lambda users: users > 3),
+         deps=["device_user_network_size"], kind="flag")
+
+
+def _ip_device_pair_freq(c: FeatureContext):
+    pairs = pair_keys(c.df, "ip_key", "device_id")
+    if c.stats is not None:
+        return c.stats.frequency("ip_device_pair", pairs)
+    _, pair_codes, counts = np.unique(pairs, return_inverse=True, return_counts=True)
+    return counts[pair_codes]
+
+
+register("ip_device_pair_freq", _ip_device_pair_freq, inputs=["ip_key", "device_id"], kind="count",
+         cross_user=True)
+
+# Statistical Aggregations
+register("rolling_mean_10", _behavior("rolling_mean_10"), behavior=["rolling_mean_10"])
+register("rolling_std_10", lambda c: np.nan_to_num(c.behavior["rolling_std_10"]), behavior=["rolling_std_10"])
@@ -0,0 +1,218 @@
+import numpy as np
+import pandas as pd
+from typing import Dict
+
+from .ip_addresses import pair_keys
+from .moments import merge_moments
+
+# Columns whose value counts feed the frequency features and category codes
+COUNTED_COLUMNS = [
+    "merchant_category", "merchant_id", "country", "location_region", "device_id",
+    "ip_key", "ip_subnet", "transaction_channel", "currency",
+]
+# Columns whose distinct-user counts feed the network features
+SHARED_COLUMNS = ["device_id", "ip_key", "ip_subnet"]
+
+
+class MomentSummary:
+    """Count, mean and sum of squared deviations; merged with Chan's formula."""
+
+    def __init__(self, n: int = 0, mean: float = 0.0, m2: float = 0.0):
+        self.n = n
+        self.mean = mean
+        self.m2 = m2
+
+    @classmethod
+    def of(cls, values) -> "MomentSummary":
+        values = np.asarray(values, dtype=np.float64)
+        if len(values) == 0:
+            return cls()
+        mean = values.mean()
+        return cls(len(values), mean, ((values - mean) ** 2).sum())
+
+    def merge(self, other: "MomentSummary") -> "MomentSummary":
+        n, mean, m2 = merge_moments(self.n, self.mean, self.m2, other.n, other.mean, other.m2)
+        return MomentSummary(n, float(mean), float(m2))
+
+    @property
+    def std(self) -> float:
+        # Sample std (ddof=1), as pandas computes it
+        return np.sqrt(self.m2 / (self.n - 1)) if self.n > 1 else np.nan
+
+
+class QuantileSummary:
+    """
+    Sorted distinct values with their counts. Exact while the number of
+    distinct values stays under max_size; beyond that neighbouring values are
+    folded into the upper one, so ranks and quantiles become approximate.
+    """
+
+    def __init__(self, values=(), counts=(), max_size: int = 2 ** 20):
+        self.values = np.asarray(values, dtype=np.float64)
+        self.counts = np.asarray(counts, dtype=np.int64)
+        self.max_size = max_size
+
+    @classmethod
+    def of(cls, values, max_size: int = 2 ** 20) -> "QuantileSummary":
+        values, counts = np.unique(np.asarray(values, dtype=np.float64), return_counts=True)
+        return cls(values, counts, max_size)._compress()
+
+    @property
+    def n(self) -> int:
+        return int(self.counts.sum())
+
+    def merge(self, other: "QuantileSummary") -> "QuantileSummary":
+        values, inverse = np.unique(np.concatenate([self.values, other.values]), return_inverse=True)
+        counts = np.bincount(inverse, weights=np.concatenate([self.counts, other.counts]), minlength=len(values))
+        return QuantileSummary(values, counts.astype(np.int64), self.max_size)._compress()
+
+    def _compress(self) -> "QuantileSummary":
+        if len(self.values) <= self.max_size:
+            return self
+        cumulative = np.cumsum(self.counts)
+        targets = np.linspace(0, cumulative[-1], self.max_size // 2 + 1)[1:]
+        keep = np.unique(np.searchsorted(cumulative, targets))
+        counts = np.diff(np.concatenate([[0], cumulative[keep]]))
+        return QuantileSummary(self.values[keep], counts, self.max_size)
+
+    def map(self, func) -> "QuantileSummary":
+        """The summary of func(values) for a monotonically increasing func."""
+        return QuantileSummary(func(self.values), self.counts, self.max_size)
+
+    def rank_pct(self, values) -> np.ndarray:
+        """Average rank of each value as a fraction of n, as `rank(pct=True)` gives."""
+        values = np.asarray(values, dtype=np.float64)
+        cumulative = np.concatenate([[0], np.cumsum(self.counts)])
+        less = cumulative[np.searchsorted(self.values, values, side="left")]
+        equal = cumulative[np.searchsorted(self.values, values, side="right")] - less
+        return (less + (equal + 1) / 2) / self.n
+
+    def quantile(self, q: float) -> float:
+        """Linearly interpolated quantile, as `Series.quantile` gives."""
+        if self.n == 0:
+            return np.nan
+        position = (self.n - 1) * q
+        cumulative = np.cumsum(self.counts)
+        lo, hi = np.searchsorted(cumulative, [np.floor(position), np.ceil(position)], side="right")
+        return self.values[lo] + (self.values[hi] - self.values[lo]) * (position - np.floor(position))
+
+
+# Lowest risk score of each report band, highest band first
+RISK_BANDS = {"critical": 90, "high": 70, "medium": 40, "low": 0}
+
+
+class RiskHistogram:
+    """
+    Risk scores counted in one-point bins ([0, 1), ..., [99, 100), and 100),
+    with the flagged count and the score sum: what the report needs, from one
+    bincount per batch. Batches merge by adding, so chunked or streaming runs
+    combine their reports without keeping the scores. Scores outside 0-100
+    go to the end bins; NaN scores count towards the total only.
+    """
+
+    N_BINS = 101
+
+    def __init__(self, n: int = 0, flagged: int = 0, risk_sum: float = 0.0, counts=None):
+        self.n = n
+        self.flagged = flagged
+        self.risk_sum = risk_sum
+        self.counts = np.zeros(self.N_BINS, dtype=np.int64) if counts is None else np.asarray(counts, dtype=np.int64)
+
+    @classmethod
+    def of(cls, is_anomaly, risk_scores) -> "RiskHistogram":
+        risk = np.asarray(risk_scores, dtype=np.float64)
+        scored = risk[~np.isnan(risk)]
+        bins = np.clip(scored, 0, cls.N_BINS - 1).astype(np.intp)
+        return cls(len(risk), int(np.count_nonzero(is_anomaly)), float(scored.sum()),
+                   np.bincount(bins, minlength=cls.N_BINS))
+
+    def merge(self, other: "RiskHistogram") -> "RiskHistogram":
+        return RiskHistogram(self.n + other.n, self.flagged + other.flagged, self.risk_sum + other.risk_sum,
+                             self.counts + other.counts)
+
+    def bands(self) -> Dict[str, int]:
+        """Scores per RISK_BANDS band; each band runs up to the next one's lowest score."""
+        cumulative = np.concatenate([[0], np.cumsum(self.counts)])
+        bands, upper = {}, self.N_BINS
+        for name, lowest in RISK_BANDS.items():
+            bands[name] = int(cumulative[upper] - cumulative[lowest])
+            upper = lowest
+        return bands
+
+
+class GlobalStats:
+    """
+    Whole-dataset statistics for features that look across users: the amount
+    distribution, value frequencies, category vocabularies and users per shared
+    device/IP. Built from chunk summaries with merge(), so a file can be
+    summarized without ever holding it in memory.
+    """
+
+    def __init__(self):
+        self.amount = MomentSummary()
+        self.amount_ranks = QuantileSummary()
+        self.counts: Dict[str, pd.Series] = {}
+        self.users: Dict[str, pd.Series] = {}
+
+    @property
+    def n(self) -> int:
+        return self.amount.n
+
+    @classmethod
+    def of(cls, df: pd.DataFrame) -> "GlobalStats":
+        stats = cls()
+        amounts = df["transaction_amount"].to_numpy(dtype=np.float64)
+        stats.amount = MomentSummary.of(amounts)
+        stats.amount_ranks = QuantileSummary.of(amounts)
+        for col in COUNTED_COLUMNS:
+            if col in df.columns:
+                counts = df[col].value_counts(sort=False)
+                stats.counts[col] = counts[counts > 0]  # Categoricals list unused categories too
+        if {"ip_key", "device_id"} <= set(df.columns):
+            pairs = pd.Series(pair_keys(df, "ip_key", "device_id"))
+            stats.counts["ip_device_pair"] = pairs.value_counts(sort=False)
+        return stats
+
+    def merge(self, other: "GlobalStats") -> "GlobalStats":
+        merged = GlobalStats()
+        merged.amount = self.amount.merge(other.amount)
+        merged.amount_ranks = self.amount_ranks.merge(other.amount_ranks)
+        merged.counts = _merge_counts(self.counts, other.counts)
+        merged.users = _merge_counts(self.users, other.users)
+        return merged
+
+    def add_users(self, df: pd.DataFrame) -> None:
+        """Count each shared value's distinct users; only exact when frames hold disjoint users."""
+        shard = {}
+        for col in SHARED_COLUMNS:
+            if col in df.columns:
+                shard[col] = df[["user_id", col]].drop_duplicates()[col].value_counts(sort=False)
+        self.users = _merge_counts(self.users, shard)
+
+    def frequency(self, col: str, values) -> np.ndarray:
+        return _lookup(self.counts[col], values)
+
+    def users_per_value(self, col: str, values) -> np.ndarray:
+        return _lookup(self.users[col], values)
+
+    def codes(self, col: str, values) -> np.ndarray:
+        """Category codes against the vocabulary of the whole dataset."""
+        vocabulary = self.counts[col].index.sort_values()
+        return pd.Categorical(values, categories=vocabulary).codes
+
+
+def _merge_counts(left: Dict[str, pd.Series], right: Dict[str, pd.Series]) -> Dict[str, pd.Series]:
+    merged = dict(left)
+    for col, counts in right.items():
+        merged[col] = merged[col].add(counts, fill_value=0) if col in merged else counts
+    return merged
+
+
+def _lookup(counts: pd.Series, values) -> np.ndarray:
+    # Per distinct value rather than per row, so Categoricals stay cheap
+    codes, uniques = pd.factorize(values)
+    per_unique = counts.reindex(uniques).to_numpy(dtype=np.float64)
+    out = np.full(len(codes), np.nan)
+    present = codes >= 0
+    out[present] = per_unique[codes[present]]
+    return out
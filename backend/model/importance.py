@@ -0,0 +1,48 @@
+from typing import Dict, List, Optional
+
+import numpy as np
+
+
+def correlation_importance(X_standard: np.ndarray, scores, columns: List[str], sample_rows: Optional[int] = None,
+                           random_state: int = 42) -> Dict[str, float]:
+    """
+    |Pearson correlation| of each feature with the anomaly scores, highest
+    first. X_standard is the feature matrix as StandardScaler transforms it,
+    so the correlations are one matrix-vector product with the standardized
+    scores; constant features (scaled to all zeros) get 0. With sample_rows
+    only that many random rows are read, an estimate for very large inputs.
+    """
+    X_standard = np.asarray(X_standard)
+    scores = np.asarray(scores, dtype=np.float64)
+    if sample_rows is not None and len(X_standard) > sample_rows:
+        rows = np.sort(np.random.default_rng(random_state).choice(len(X_standard), sample_rows, replace=False))
+        X_standard, scores = X_standard[rows], scores[rows]
+    spread = scores.std()
+    if spread == 0:
+        return dict.fromkeys(columns, 0.0)
+    standard_scores = ((scores - scores.mean()) / spread).astype(X_standard.dtype)
+    corr = np.abs(X_standard.T @ standard_scores) / len(X_standard)
+    importance = dict(zip(columns, np.nan_to_num(corr.astype(np.float64), nan=0.0).tolist()))
+    return dict(sorted(importance.items(), key=lambda x: x[1], reverse=True))
+
+
+def permutation_importance(model, X: np.ndarray, columns: List[str], n_repeats: int = 3,
+                           random_state: int = 42) -> Dict[str, float]:
+    """
+    Mean absolute change in model.score_samples over X when one column is
+    shuffled, per column, highest first. Costs columns x n_repeats scorings
+    of X, so X should be a sample.
+    """
+    rng = np.random.default_rng(random_state)
+    X = np.array(X, dtype=np.float64)
+    baseline = model.score_samples(X)
+    importance = {}
+    for j, col in enumerate(columns):
+        original = X[:, j].copy()
+        changes = []
+        for _ in range(n_repeats):
+            X[:, j] = rng.permutation(original)
+            changes.append(np.abs(model.score_samples(X) - baseline).mean())
+        X[:, j] = original
+        importance[col] = float(np.mean(changes))
+    return dict(sorted(importance.items(), key=lambda x: x[1], reverse=True))
@@ -0,0 +1,56 @@
+import numpy as np
+from sklearn.cluster import DBSCAN
+from sklearn.neighbors import NearestNeighbors
+
+
+class InductiveDBSCAN:
+    """
+    DBSCAN clustered once, on the training data. New points are labelled
+    against its core samples, held in a nearest-neighbour index: a point
+    within eps of a core sample joins that sample's cluster (it would be a
+    border point), any other point is noise (-1). On the training data itself
+    the noise points are DBSCAN's (a border point near two clusters may join
+    either, and brute-force distances round differently right at eps).
+
+    Scoring is one nearest-neighbour query per point instead of re-clustering
+    the scored batch. algorithm="auto" lets sklearn pick: a KD- or ball tree
+    for a few dimensions, blocked brute force (BLAS distances) above 15,
+    where the trees degrade towards comparing every pair anyway.
+    """
+
+    def __init__(self, eps: float = 0.5, min_samples: int = 5, algorithm: str = "auto", leaf_size: int = 40,
+                 n_jobs=None):
+        self.eps = eps
+        self.min_samples = min_samples
+        self.algorithm = algorithm
+        self.leaf_size = leaf_size
+        self.n_jobs = n_jobs
+
+    def fit(self, X) -> "InductiveDBSCAN":
+        dbscan = DBSCAN(eps=self.eps, min_samples=self.min_samples, n_jobs=self.n_jobs).fit(X)
+        core = dbscan.core_sample_indices_
+        self.labels_ = dbscan.labels_
+        self.core_labels_ = dbscan.labels_[core]
+        self.index_ = None
+        if len(core):
+            self.index_ = NearestNeighbors(n_neighbors=1, algorithm=self.algorithm, leaf_size=self.leaf_size,
+                                           n_jobs=self.n_jobs).fit(np.asarray(X)[core])
+        return self
+
+    def fit_predict(self, X) -> np.ndarray:
+        return self.fit(X).labels_
+
+    def score_samples(self, X) -> np.ndarray:
+        """Minus the distance to the nearest core sample; lower is more abnormal, as in sklearn."""
+        X = np.asarray(X)
+        if self.index_ is None:
+            return np.full(len(X), -np.inf)
+        return -self.index_.kneighbors(X)[0][:, 0]
+
+    def predict(self, X) -> np.ndarray:
+        """Cluster label of each point's nearest core sample within eps, else -1."""
+        X = np.asarray(X)
+        if self.index_ is None:
+            return np.full(len(X), -1, dtype=np.int64)
+        distance, nearest = self.index_.kneighbors(X)
+        return np.where(distance[:, 0] <= self.eps, self.core_labels_[nearest[:, 0]], -1)
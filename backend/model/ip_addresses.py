@@ -0,0 +1,123 @@
+import ipaddress
+from typing import Tuple
+
+import numpy as np
+import pandas as pd
+
+# Integer columns standardize derives from the raw ip_address column:
+#   ip_key    - the address itself: IPv4 as its 32-bit value, IPv6 (and any
+#               unparseable text) as a negative 62-bit hash
+#   ip_subnet - its network: the /24 for IPv4, a hash of the /64 for IPv6
+IP_KEY_COLUMNS = ["ip_key", "ip_subnet"]
+# Longest text that can still be an IPv4 address ("255.255.255.255")
+_IPV4_WIDTH = 15
+# Longer text has its distinct characters counted one string at a time
+_ENTROPY_WIDTH = 64
+
+
+def add_ip_keys(df: pd.DataFrame) -> pd.DataFrame:
+    """Adds the IP_KEY_COLUMNS (nullable Int64) when the frame has an ip_address column."""
+    if "ip_address" in df.columns:
+        df["ip_key"], df["ip_subnet"] = parse_ips(df["ip_address"])
+    return df
+
+
+def parse_ips(values) -> Tuple[pd.arrays.IntegerArray, pd.arrays.IntegerArray]:
+    """(ip_key, ip_subnet) per value; each distinct address is parsed once."""
+    codes, uniques = pd.factorize(values)
+    text = np.asarray(uniques, dtype=object).astype(str)
+    keys = np.zeros(len(text) + 1, dtype=np.int64)  # the extra slot is for missing values
+    subnets = np.zeros(len(text) + 1, dtype=np.int64)
+    no_subnet = np.zeros(len(text) + 1, dtype=bool)
+    no_subnet[-1] = True
+
+    is_v4, v4 = _parse_ipv4(text)
+    keys[:-1][is_v4] = v4
+    subnets[:-1][is_v4] = v4 >> 8
+
+    # Everything else goes through ipaddress: IPv6, IPv4-mapped IPv6, junk
+    hashed_keys, hashed_subnets = {}, {}
+    for i in np.flatnonzero(~is_v4):
+        try:
+            address = ipaddress.ip_address(text[i])
+        except ValueError:
+            hashed_keys[i] = b"s" + text[i].encode("utf-8", "surrogatepass")
+            no_subnet[i] = True
+            continue
+        if address.version == 6 and address.ipv4_mapped is None:
+            hashed_keys[i] = b"6" + address.packed
+            hashed_subnets[i] = address.packed[:8]
+        else:
+            keys[i] = int(address.ipv4_mapped or address)
+            subnets[i] = keys[i] >> 8
+    keys[list(hashed_keys)] = _negative_hash(list(hashed_keys.values()))
+    subnets[list(hashed_subnets)] = _negative_hash(list(hashed_subnets.values()))
+
+    rows = np.where(codes >= 0, codes, len(text))
+    return (pd.arrays.IntegerArray(keys[rows], rows == len(text)),
+            pd.arrays.IntegerArray(subnets[rows], no_subnet[rows]))
+
+
+def ip_entropy(values) -> np.ndarray:
+    """Distinct characters in each value's text; missing values read as "nan", as astype(str) gives."""
+    codes, uniques = pd.factorize(values, use_na_sentinel=False)
+    text = np.asarray(uniques, dtype=object).astype(str)
+    counts = np.zeros(len(text), dtype=np.int64)
+    short = np.char.str_len(text) <= _ENTROPY_WIDTH
+    if short.any():
+        chars = np.sort(_char_matrix(text[short]), axis=1)
+        new = chars != 0
+        new[:, 1:] &= chars[:, 1:] != chars[:, :-1]
+        counts[short] = new.sum(axis=1)
+    counts[~short] = [len(set(value)) for value in text[~short]]
+    return counts[codes]
+
+
+def pair_keys(df: pd.DataFrame, left: str, right: str) -> np.ndarray:
+    """An int64 hash per row of the (left, right) value pair; missing values hash like any other value."""
+    hashes = pd.util.hash_pandas_object(df[[left, right]], index=False).to_numpy()
+    return hashes.view(np.int64)
+
+
+def _parse_ipv4(text: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """(is dotted-quad IPv4, its 32-bit value) per string, decoded as a matrix of characters."""
+    is_v4 = np.zeros(len(text), dtype=bool)
+    candidates = np.flatnonzero(np.char.str_len(text) <= _IPV4_WIDTH)
+    if not len(candidates):
+        return is_v4, np.zeros(0, dtype=np.int64)
+
+    chars = _char_matrix(text[candidates]).astype(np.int64)
+    digit = (chars >= ord("0")) & (chars <= ord("9"))
+    dot = chars == ord(".")
+    ok = ((digit | dot) == (chars != 0)).all(axis=1) & (dot.sum(axis=1) == 3)
+
+    octet = np.minimum(np.cumsum(dot, axis=1), 3)
+    rows = np.arange(len(candidates))
+    value = np.zeros((len(candidates), 4), dtype=np.int64)
+    length = np.zeros((len(candidates), 4), dtype=np.int64)
+    leading_zero = np.zeros((len(candidates), 4), dtype=bool)
+    for j in range(chars.shape[1]):
+        r, o = rows[digit[:, j]], octet[digit[:, j], j]
+        d = chars[r, j] - ord("0")
+        leading_zero[r, o] |= (length[r, o] == 0) & (d == 0)
+        value[r, o] = value[r, o] * 10 + d
+        length[r, o] += 1
+    # Strict like ipaddress: 1-3 digits per octet, at most 255, no leading zeros
+    ok &= ((length >= 1) & (length <= 3) & (value <= 255) & ~(leading_zero & (length > 1))).all(axis=1)
+
+    is_v4[candidates[ok]] = True
+    v4 = value[ok]
+    return is_v4, (v4[:, 0] << 24) | (v4[:, 1] << 16) | (v4[:, 2] << 8) | v4[:, 3]
+
+
+def _char_matrix(text: np.ndarray) -> np.ndarray:
+    # A fixed-width unicode array is UCS-4 underneath: one uint32 per character, zero-padded
+    text = np.ascontiguousarray(text.astype(str))
+    return text.view(np.uint32).reshape(len(text), max(text.dtype.itemsize // 4, 1))
+
+
+def _negative_hash(items) -> np.ndarray:
+    # Below zero, so hashes never collide with IPv4 values, and above the
+    # int64 minimum columns.py uses to mark missing integers
+    hashes = pd.util.hash_array(np.array(items, dtype=object)) if items else np.zeros(0, dtype=np.uint64)
+    return -(hashes >> np.uint64(2)).astype(np.int64) - 1
@@ -0,0 +1,18 @@
+import numpy as np
+
+
+def merge_moments(n_a, mean_a, m2_a, n_b, mean_b, m2_b):
+    """
+    Chan et al.'s parallel merge of two (count, mean, M2) summaries, M2 being
+    the sum of squared deviations from the mean. Works elementwise on arrays
+    of summaries (one per user, say); with a vector mean and a co-moment
+    matrix M2 the correction term is the outer product of the mean shift.
+    A side with count 0 contributes nothing.
+    """
+    n = n_a + n_b
+    with np.errstate(invalid="ignore", divide="ignore"):
+        delta = mean_b - mean_a
+        shift = np.multiply.outer(delta, delta) if np.ndim(m2_b) > np.ndim(mean_b) else delta * delta
+        mean = np.where(n_a > 0, mean_a + delta * n_b / n, mean_b)
+        m2 = np.where(n_a > 0, m2_a + m2_b + shift * n_a * n_b / n, m2_b)
+    return n, mean, m2
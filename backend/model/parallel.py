@@ -0,0 +1,136 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .columns import decode_column, encode_column
+from .features import FEATURES, compute_features, cross_user_features, plan, required_columns
+
+# Shards per worker, so a shard holding a few heavy users doesn't leave the
+# other workers idle at the end
+SHARDS_PER_WORKER = 4
+# Below this many rows per worker, starting processes costs more than it saves
+MIN_ROWS_PER_WORKER = 20000
+
+# Segments a worker has mapped, kept open for the life of the process
+_ATTACHED: Dict[str, shared_memory.SharedMemory] = {}
+
+
+class SharedFrame:
+    """
+    A DataFrame's columns copied once into shared memory, so worker processes
+    can map any row range of it instead of receiving a pickled copy. Text
+    columns travel as integer codes plus their table of distinct values.
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        self.segments: List[shared_memory.SharedMemory] = []
+        # (column, segment name, dtype, kind, distinct values); see columns.py
+        self.layout: List[Tuple[str, str, str, str, Optional[np.ndarray]]] = []
+        for col in df.columns:
+            kind, data, values = encode_column(df[col])
+            self.layout.append((col, self._share(data), data.dtype.str, kind, values))
+
+    def _share(self, data: np.ndarray) -> str:
+        segment = shared_memory.SharedMemory(create=True, size=max(data.nbytes, 1))
+        self.segments.append(segment)
+        view = np.ndarray(data.shape, dtype=data.dtype, buffer=segment.buf)
+        view[:] = data
+        del view  # no exported buffers may remain when the segment is closed
+        return segment.name
+
+    def release(self) -> None:
+        for segment in self.segments:
+            segment.close()
+            segment.unlink()
+        self.segments = []
+
+
+def attach(layout, n_rows: int, lo: int, hi: int, columns=None) -> pd.DataFrame:
+    """Rows [lo, hi) of a SharedFrame, as views into its shared segments where possible."""
+    frame = {}
+    for col, name, dtype, kind, values in layout:
+        if columns is not None and col not in columns:
+            continue
+        segment = _ATTACHED.get(name)
+        if segment is None:
+            segment = _ATTACHED[name] = shared_memory.SharedMemory(name=name)
+        data = np.ndarray(n_rows, dtype=np.dtype(dtype), buffer=segment.buf)[lo:hi]
+        frame[col] = decode_column(kind, data, values)
+    return pd.DataFrame(frame, index=pd.RangeIndex(lo, hi), copy=False)
+
+
+def _features(layout, n_rows: int, lo: int, hi: int, names: List[str], compact: bool,
+              vocabularies: Optional[Dict[str, np.ndarray]]) -> Dict[str, np.ndarray]:
+    df = attach(layout, n_rows, lo, hi, required_columns(names))
+    features = compute_features(df, names, compact=compact, vocabularies=vocabularies)
+    return {col: np.asarray(features[col]) for col in features.columns}
+
+
+def user_shards(user_ids, n_shards: int) -> List[Tuple[int, int]]:
+    """Row ranges of about equal size that never split a user; rows must be sorted by user."""
+    user_ids = np.asarray(user_ids)
+    n = len(user_ids)
+    is_start = np.ones(n, dtype=bool)
+    is_start[1:] = user_ids[1:] != user_ids[:-1]
+    starts = np.flatnonzero(is_start)
+
+    targets = np.linspace(0, n, n_shards + 1)[1:-1]
+    cuts = np.unique(starts[np.minimum(np.searchsorted(starts, targets), len(starts) - 1)])
+    bounds = [0] + [int(cut) for cut in cuts if 0 < cut < n] + [n]
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def reduction_groups(names: List[str]) -> List[List[str]]:
+    """Cross-user features grouped with the features derived from them, one task per group."""
+    owner: Dict[str, str] = {}
+    groups: Dict[str, List[str]] = {}
+    for name in names:
+        owner[name] = next((owner[dep] for dep in FEATURES[name].deps if dep in owner), name)
+        groups.setdefault(owner[name], []).append(name)
+    return list(groups.values())
+
+
+def parallel_features(df: pd.DataFrame, names: Optional[List[str]] = None, n_jobs: int = -1,
+                      compact: bool = False,
+                      vocabularies: Optional[Dict[str, np.ndarray]] = None) -> pd.DataFrame:
+    """
+    compute_features in a process pool, reading the frame from shared memory.
+    Per-user and per-row features run on user-contiguous shards. Cross-user
+    features (frequencies, category codes, users per device/IP, global amount
+    stats) need every row, so they form a separate reduction step: one
+    whole-frame task per feature and the flags derived from it.
+    Rows must be sorted by user, as load_and_preprocess leaves them.
+    """
+    n_jobs = os.cpu_count() if n_jobs in (None, -1) else n_jobs
+    n_jobs = max(1, min(n_jobs, len(df) // MIN_ROWS_PER_WORKER))
+    if n_jobs == 1:
+        return compute_features(df, names, compact=compact, vocabularies=vocabularies)
+
+    requested = [spec.name for spec in plan(names, df.columns) if names is None or spec.name in names]
+    cross_user = cross_user_features()
+    per_user = [name for name in requested if name not in cross_user]
+    groups = reduction_groups([name for name in requested if name in cross_user])
+
+    needed = required_columns(requested)
+    shared = SharedFrame(df[[col for col in df.columns if col in needed]])
+    try:
+        with ProcessPoolExecutor(max_workers=n_jobs) as pool:
+            # Whole-frame reductions first: each is a single long task
+            reductions = [pool.submit(_features, shared.layout, len(df), 0, len(df), group, compact, vocabularies)
+                          for group in groups]
+            shards = [pool.submit(_features, shared.layout, len(df), lo, hi, per_user, compact, None)
+                      for lo, hi in user_shards(df["user_id"].to_numpy(), n_jobs * SHARDS_PER_WORKER)
+                      if per_user]
+            parts = [future.result() for future in shards]
+            reduced = [future.result() for future in reductions]
+    finally:
+        shared.release()
+
+    columns = {name: np.concatenate([part[name] for part in parts]) for name in (parts[0] if parts else [])}
+    for part in reduced:
+        columns.update(part)
+    return pd.DataFrame({name: columns[name] for name in requested if name in columns}, index=df.index)
@@ -0,0 +1,21 @@
+from sklearn.decomposition import PCA
+from sklearn.random_projection import SparseRandomProjection
+
+PROJECTION_METHODS = ("pca", "random")
+
+
+def make_projection(method: str, n_components: int, random_state=None):
+    """
+    An unfitted projection to n_components dimensions:
+      - "pca": the leading principal components; keeps the most variance,
+        shrinks distances by the variance it drops.
+      - "random": a sparse random projection; fitting only draws the matrix,
+        and pairwise distances are preserved in expectation
+        (Johnson-Lindenstrauss), so distance cutoffs like DBSCAN's eps keep
+        roughly their meaning.
+    """
+    if method == "pca":
+        return PCA(n_components=n_components, random_state=random_state)
+    if method == "random":
+        return SparseRandomProjection(n_components=n_components, random_state=random_state)
+    raise ValueError(f"Unknown projection {method!r}, expected one of {PROJECTION_METHODS}")
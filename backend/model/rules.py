@@ -0,0 +1,287 @@
+import ast
+import json
+import os
+from functools import reduce
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+try:
+    import numexpr
+except ImportError:  # optional; the same expressions then run through NumPy
+    numexpr = None
+
+# The shipped spec; EliteFraudDetector(rules=...) takes another file or a dict
+DEFAULT_RULES = os.path.join(os.path.dirname(__file__), "risk_rules.json")
+
+# Reasons shown per flagged transaction
+MAX_REASONS = 5
+# Reason bits fit an int64 sum
+MAX_REASON_RULES = 63
+
+RULE_FIELDS = {"name", "when", "points", "cap", "group", "reason", "value", "priority", "requires"}
+
+# Functions a rule expression may call
+FUNCTIONS = {
+    "abs": np.abs,
+    "int": lambda values: np.asarray(values).astype(np.int64),
+    "where": np.where,
+    "sqrt": np.sqrt,
+    "log1p": np.log1p,
+    "minimum": np.minimum,
+    "maximum": np.maximum,
+}
+# Those numexpr has too; expressions calling any other run through NumPy
+NUMEXPR_FUNCTIONS = {"abs", "where", "sqrt", "log1p"}
+
+_ALLOWED_NODES = (
+    ast.Expression, ast.BinOp, ast.UnaryOp, ast.BoolOp, ast.Compare, ast.Name, ast.Load, ast.Constant, ast.Call,
+    ast.Add, ast.Sub, ast.Mult, ast.Div, ast.Pow, ast.Mod, ast.BitAnd, ast.BitOr, ast.And, ast.Or,
+    ast.USub, ast.UAdd, ast.Not, ast.Invert, ast.Eq, ast.NotEq, ast.Lt, ast.LtE, ast.Gt, ast.GtE,
+)
+
+
+class _Vectorize(ast.NodeTransformer):
+    """Rejects anything but arithmetic, comparisons, boolean logic and FUNCTIONS; and/or/not become &, |, ~."""
+
+    def generic_visit(self, node):
+        if not isinstance(node, _ALLOWED_NODES):
+            raise ValueError(f"{type(node).__name__} is not allowed in a rule expression")
+        return super().generic_visit(node)
+
+    def visit_Constant(self, node):
+        if isinstance(node.value, bool) or not isinstance(node.value, (int, float)):
+            raise ValueError(f"constant {node.value!r} is not a number")
+        return node
+
+    def visit_Compare(self, node):
+        if len(node.ops) > 1:
+            raise ValueError("chained comparisons are not supported, join them with 'and'")
+        return self.generic_visit(node)
+
+    def visit_Call(self, node):
+        if not isinstance(node.func, ast.Name) or node.func.id not in FUNCTIONS or node.keywords:
+            raise ValueError(f"unknown function in {ast.unparse(node)!r}, expected one of {sorted(FUNCTIONS)}")
+        node.args = [self.visit(arg) for arg in node.args]
+        return node
+
+    def visit_BoolOp(self, node):
+        node = self.generic_visit(node)
+        op = ast.BitAnd() if isinstance(node.op, ast.And) else ast.BitOr()
+        return reduce(lambda left, right: ast.BinOp(left, op, right), node.values)
+
+    def visit_UnaryOp(self, node):
+        node = self.generic_visit(node)
+        return ast.UnaryOp(ast.Invert(), node.operand) if isinstance(node.op, ast.Not) else node
+
+
+class Expression:
+    """
+    A rule expression compiled once: evaluated by numexpr in one fused pass
+    over its columns when numexpr is installed and knows all its functions,
+    by NumPy otherwise. Both give the same values.
+    """
+
+    def __init__(self, source: str):
+        tree = ast.fix_missing_locations(_Vectorize().visit(ast.parse(source.strip(), mode="eval")))
+        calls = {node.func.id for node in ast.walk(tree) if isinstance(node, ast.Call)}
+        self.source = source
+        self.names = list(dict.fromkeys(
+            node.id for node in ast.walk(tree) if isinstance(node, ast.Name) and node.id not in calls))
+        self.vectorized = ast.unparse(tree)
+        self.code = compile(tree, "<rule>", "eval")
+        self.numexpr = numexpr is not None and calls <= NUMEXPR_FUNCTIONS
+
+    def __call__(self, values: Dict[str, np.ndarray], n_rows: int) -> np.ndarray:
+        local = {name: values[name] for name in self.names}
+        if self.numexpr:
+            result = numexpr.evaluate(self.vectorized, local_dict=local, global_dict={})
+        else:
+            result = eval(self.code, {"__builtins__": {}, **FUNCTIONS}, local)
+        return np.broadcast_to(result, n_rows) if np.ndim(result) == 0 else result
+
+
+class RiskRule:
+    """
+    One rule of a spec:
+      - when: condition for the rule to hold (all rows if omitted)
+      - points: risk added where it holds, an expression or number, at most cap
+      - group: a spec group its points are pooled with, capped together
+      - reason: text shown where it holds; a {} field is filled with value
+      - priority: reasons are listed lowest first
+      - requires: features it reads besides those its expressions name
+    """
+
+    def __init__(self, spec: Dict):
+        self.name = spec.get("name")
+        unknown = set(spec) - RULE_FIELDS
+        if not self.name or unknown:
+            raise ValueError(f"Rule {self.name!r}: needs a name, unknown fields {sorted(unknown)}")
+        try:
+            self.when = Expression(spec["when"]) if "when" in spec else None
+            self.points = Expression(str(spec["points"])) if "points" in spec else None
+            self.value = Expression(spec["value"]) if "value" in spec else None
+        except (SyntaxError, ValueError) as error:
+            raise ValueError(f"Rule {self.name!r}: {error}") from None
+        self.cap = spec.get("cap")
+        self.group = spec.get("group")
+        self.text = spec.get("reason")
+        self.priority = spec.get("priority", 0)
+        if self.points is None and self.text is None:
+            raise ValueError(f"Rule {self.name!r}: needs points or a reason")
+        if self.text is not None and self.when is None:
+            raise ValueError(f"Rule {self.name!r}: a reason needs a when condition")
+        if self.dynamic and self.value is None:
+            raise ValueError(f"Rule {self.name!r}: reason {self.text!r} has a field but no value")
+        expressions = [e for e in (self.when, self.points, self.value) if e is not None]
+        self.requires = list(dict.fromkeys(spec.get("requires", []) + [n for e in expressions for n in e.names]))
+
+    @property
+    def dynamic(self) -> bool:
+        return self.text is not None and "{" in self.text
+
+    def penalty_source(self) -> str:
+        """This rule's points where it holds, capped, as one expression."""
+        points = f"({self.points.vectorized})"
+        if self.when is not None:
+            points = f"where({self.when.vectorized}, {points}, 0)"
+        return points if self.cap is None else _capped(points, self.cap)
+
+
+def _capped(source: str, cap: float) -> str:
+    # minimum() without numexpr's missing function; NaN stays NaN as with np.minimum
+    return f"where({source} > {cap}, {cap}, {source})"
+
+
+class RuleSet:
+    """
+    A compiled risk-rule spec: {"parameters": [...], "groups": {name: cap},
+    "rules": [...]} (see RiskRule and risk_rules.json). Scoring and
+    explanations share it. Rules naming a feature the batch lacks, or a
+    parameter passed as None, are skipped: no points and never a reason.
+    """
+
+    def __init__(self, spec: Dict):
+        self.parameters = list(spec.get("parameters", []))
+        self.groups = dict(spec.get("groups", {}))
+        self.rules = [RiskRule(rule) for rule in spec.get("rules", [])]
+        names = [rule.name for rule in self.rules]
+        if len(set(names)) < len(names):
+            raise ValueError(f"Duplicate rule names in {names}")
+        for rule in self.rules:
+            if rule.group is not None and rule.group not in self.groups:
+                raise ValueError(f"Rule {rule.name!r}: unknown group {rule.group!r}, spec has {list(self.groups)}")
+            if rule.group is not None and rule.points is None:
+                raise ValueError(f"Rule {rule.name!r}: a group member needs points")
+        # Penalties apply in spec order, reasons are ranked by priority
+        self.penalties = [rule for rule in self.rules if rule.points is not None]
+        self.reasons = sorted((rule for rule in self.rules if rule.text is not None), key=lambda rule: rule.priority)
+        if len(self.reasons) > MAX_REASON_RULES:
+            raise ValueError(f"At most {MAX_REASON_RULES} rules can give reasons, spec has {len(self.reasons)}")
+        self._fused: Dict[tuple, Expression] = {}
+
+    @classmethod
+    def load(cls, path: str = DEFAULT_RULES) -> "RuleSet":
+        with open(path, encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    @property
+    def features(self) -> List[str]:
+        """Features any rule reads."""
+        return list(dict.fromkeys(name for rule in self.rules for name in rule.requires
+                                  if name not in self.parameters))
+
+    def _applicable(self, rules: List[RiskRule], features: pd.DataFrame, params: Dict) -> List[RiskRule]:
+        return [rule for rule in rules if all(
+            params.get(name) is not None if name in self.parameters else name in features.columns
+            for name in rule.requires)]
+
+    def _values(self, rules: List[RiskRule], features: pd.DataFrame, params: Dict,
+                rows: Optional[np.ndarray] = None) -> Dict[str, np.ndarray]:
+        """Each column the rules read, loaded once (only `rows` of it when given), and the parameters."""
+        values = {name: params[name] for name in self.parameters if params.get(name) is not None}
+        for name in dict.fromkeys(name for rule in rules for name in rule.requires):
+            if name not in values:
+                column = features[name].to_numpy()
+                values[name] = column if rows is None else column[rows]
+        return values
+
+    def _fuse(self, key: tuple, build) -> Expression:
+        # One expression per set of applicable rules, compiled the first time it's seen
+        if key not in self._fused:
+            self._fused[key] = Expression(build())
+        return self._fused[key]
+
+    def add_penalties(self, base: np.ndarray, features: pd.DataFrame, params: Optional[Dict] = None) -> np.ndarray:
+        """
+        base plus each applicable rule's points, added in spec order in one
+        fused pass. A group's members are summed and capped together, and
+        added where its first member comes.
+        """
+        params = params or {}
+        rules = self._applicable(self.penalties, features, params)
+
+        def build() -> str:
+            terms, pooled = [], {}
+            for rule in rules:
+                if rule.group is None:
+                    terms.append(rule.penalty_source())
+                elif rule.group not in pooled:
+                    pooled[rule.group] = []
+                    terms.append(rule.group)
+                if rule.group is not None:
+                    pooled[rule.group].append(rule.penalty_source())
+            terms = [_capped("(" + " + ".join(pooled[t]) + ")", self.groups[t]) if t in pooled else t for t in terms]
+            return " + ".join(["_base"] + terms)
+
+        values = self._values(rules, features, params)
+        values["_base"] = np.asarray(base)
+        return self._fuse(("penalties",) + tuple(rule.name for rule in rules), build)(values, len(base))
+
+    def reason_masks(self, features: pd.DataFrame, params: Optional[Dict] = None,
+                     rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Bit i set where reasons[i] holds, one uint64 per row of the batch,
+        or per row in `rows` when given; every condition in one fused pass.
+        """
+        params = params or {}
+        n_rows = len(features) if rows is None else len(rows)
+        rules = self._applicable(self.reasons, features, params)
+        if not rules:
+            return np.zeros(n_rows, dtype=np.uint64)
+        bits = {rule.name: bit for bit, rule in enumerate(self.reasons)}
+
+        def build() -> str:
+            return " + ".join(f"where({rule.when.vectorized}, {1 << bits[rule.name]}, 0)" for rule in rules)
+
+        values = self._values(rules, features, params, rows)
+        masks = self._fuse(("reasons",) + tuple(rule.name for rule in rules), build)(values, n_rows)
+        return masks.astype(np.uint64)
+
+    def explain(self, features: pd.DataFrame, rows: np.ndarray, risk: np.ndarray, params: Optional[Dict] = None,
+                max_reasons: int = MAX_REASONS) -> List[str]:
+        """
+        Text for the given rows only, from their risk scores (aligned with
+        rows): the risk plus the first max_reasons reasons. Rows are grouped
+        by reason mask; each distinct mask becomes one format template,
+        filled per row with its risk and its rendered reasons' values.
+        """
+        params = params or {}
+        masks = self.reason_masks(features, params, rows)
+        texts = np.empty(len(rows), dtype=object)
+        distinct, group = np.unique(masks, return_inverse=True)
+        order = np.argsort(group, kind="stable")
+        bounds = np.searchsorted(group[order], np.arange(len(distinct) + 1))
+        for i, mask in enumerate(distinct.tolist()):
+            members = order[bounds[i]:bounds[i + 1]]
+            reasons = [rule for bit, rule in enumerate(self.reasons) if mask >> bit & 1][:max_reasons]
+            template = "[RISK: {:.0f}/100] " + (" | ".join(rule.text for rule in reasons)
+                                                 or "Statistical anomaly detected")
+            columns = [risk[members].tolist()]
+            dynamic = [rule for rule in reasons if rule.dynamic]
+            if dynamic:
+                values = self._values(dynamic, features, params, rows[members])
+                columns += [rule.value(values, len(members)).tolist() for rule in dynamic]
+            texts[members] = [template.format(*row) for row in zip(*columns)]
+        return texts.tolist()
@@ -0,0 +1,194 @@
+import numpy as np
+import pandas as pd
+from typing import Dict, List
+
+VELOCITY_WINDOWS = ["1min", "5min", "15min", "1H", "6H", "24H"]
+
+
+class GroupIndex:
+    """
+    Integer user codes and segment boundaries for a frame sorted by user.
+    Built once per batch; every per-user aggregate is then a segment
+    operation on contiguous arrays instead of a fresh groupby.
+    """
+
+    def __init__(self, keys):
+        keys = np.asarray(keys)
+        self.n = len(keys)
+        is_start = np.ones(self.n, dtype=bool)
+        if self.n > 1:
+            is_start[1:] = keys[1:] != keys[:-1]
+
+        self.starts = np.flatnonzero(is_start)
+        self.sizes = np.diff(np.append(self.starts, self.n))
+        self.codes = np.cumsum(is_start) - 1
+        self.row_starts = self.starts[self.codes]
+        self.positions = np.arange(self.n) - self.row_starts
+
+    @property
+    def n_groups(self) -> int:
+        return len(self.starts)
+
+    def broadcast(self, per_group: np.ndarray) -> np.ndarray:
+        return per_group[self.codes]
+
+    def cumcount(self) -> np.ndarray:
+        return self.positions.copy()
+
+    def shift(self, values, fill=np.nan) -> np.ndarray:
+        values = np.asarray(values, dtype=np.float64)
+        out = np.empty(self.n, dtype=np.float64)
+        out[1:] = values[:-1]
+        out[self.starts] = fill
+        return out
+
+    def diff(self, values) -> np.ndarray:
+        # Subtract in the input dtype so int64 nanosecond timestamps stay exact
+        values = np.asarray(values)
+        out = np.empty(self.n, dtype=np.float64)
+        out[1:] = values[1:] - values[:-1]
+        out[self.starts] = np.nan
+        return out
+
+    def _reduce(self, ufunc, values) -> np.ndarray:
+        if self.n == 0:
+            return np.empty(0, dtype=np.float64)
+        return ufunc.reduceat(values, self.starts)
+
+    def count(self, values) -> np.ndarray:
+        return self._reduce(np.add, ~np.isnan(values)).astype(np.int64)
+
+    def mean(self, values) -> np.ndarray:
+        values = np.asarray(values, dtype=np.float64)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return self._reduce(np.add, np.nan_to_num(values)) / self.count(values)
+
+    def std(self, values, ddof: int = 1) -> np.ndarray:
+        # Two-pass: deviations from the segment mean, as pandas does.
+        values = np.asarray(values, dtype=np.float64)
+        deviation = np.nan_to_num(values - self.broadcast(self.mean(values)))
+        with np.errstate(invalid="ignore", divide="ignore"):
+            variance = self._reduce(np.add, deviation ** 2) / (self.count(values) - ddof)
+        variance[self.count(values) <= ddof] = np.nan
+        return np.sqrt(variance)
+
+    def min(self, values) -> np.ndarray:
+        return self._reduce(np.fmin, np.asarray(values, dtype=np.float64))
+
+    def max(self, values) -> np.ndarray:
+        return self._reduce(np.fmax, np.asarray(values, dtype=np.float64))
+
+    def median(self, values) -> np.ndarray:
+        values = np.asarray(values, dtype=np.float64)
+        ordered = values[np.lexsort((values, self.codes))]  # NaNs sort last within a segment
+        valid = self.count(values)
+        lo = self.starts + np.maximum(valid - 1, 0) // 2
+        hi = self.starts + np.maximum(valid, 1) // 2
+        if self.n == 0:
+            return np.empty(0, dtype=np.float64)
+        median = (ordered[lo] + ordered[np.minimum(hi, self.n - 1)]) / 2
+        median[valid == 0] = np.nan
+        return median
+
+    def _pairs(self, values):
+        # Pair each row's user code with its value code; missing values get
+        # code 0 so they still compare equal to each other, like `duplicated`.
+        value_codes, uniques = pd.factorize(values)
+        value_codes = value_codes.astype(np.int64) + 1
+        return self.codes.astype(np.int64) * (len(uniques) + 1) + value_codes, value_codes
+
+    def first_occurrence(self, values) -> np.ndarray:
+        """True where a user is seen with this value for the first time."""
+        pairs, _ = self._pairs(values)
+        return ~pd.Series(pairs).duplicated().to_numpy()
+
+    def nunique(self, values) -> np.ndarray:
+        pairs, value_codes = self._pairs(values)
+        distinct = ~pd.Series(pairs).duplicated().to_numpy() & (value_codes > 0)
+        return self._reduce(np.add, distinct).astype(np.int64)
+
+    def pair_cumcount(self, values) -> np.ndarray:
+        """Running count of each (user, value) pair; NaN where the value is missing."""
+        pairs, value_codes = self._pairs(values)
+        order = np.argsort(pairs, kind="stable")
+        ordered = pairs[order]
+        is_start = np.ones(self.n, dtype=bool)
+        is_start[1:] = ordered[1:] != ordered[:-1]
+        run_starts = np.flatnonzero(is_start)
+        run_lengths = np.diff(np.append(run_starts, self.n))
+
+        out = np.empty(self.n, dtype=np.float64)
+        out[order] = np.arange(self.n) - np.repeat(run_starts, run_lengths)
+        out[value_codes == 0] = np.nan
+        return out
+
+    def users_per_value(self, values) -> np.ndarray:
+        """For each row, the number of distinct users sharing its value."""
+        pairs, value_codes = self._pairs(values)
+        distinct = ~pd.Series(pairs).duplicated().to_numpy()
+        users = np.bincount(value_codes, weights=distinct).astype(np.int64)
+        out = users[value_codes].astype(np.float64)
+        out[value_codes == 0] = np.nan
+        return out
+
+    def rolling_mean_std(self, values, window: int):
+        """Trailing `window`-row mean and sample std within each segment."""
+        values = np.asarray(values, dtype=np.float64)
+        rows = np.arange(self.n)
+        counts = np.minimum(self.positions + 1, window)
+
+        total = np.zeros(self.n)
+        for lag in range(window):
+            valid = self.positions >= lag
+            total[valid] += values[rows[valid] - lag]
+        mean = total / np.maximum(counts, 1)
+
+        squares = np.zeros(self.n)
+        for lag in range(window):
+            valid = self.positions >= lag
+            squares[valid] += (values[rows[valid] - lag] - mean[valid]) ** 2
+        with np.errstate(invalid="ignore", divide="ignore"):
+            std = np.sqrt(squares / (counts - 1))
+        std[counts < 2] = np.nan
+        return mean, std
+
+
+def window_starts(times: np.ndarray, lo: np.ndarray, bound: np.ndarray) -> np.ndarray:
+    """
+    For every row i, the first j in [lo[i], i] with times[j] > bound[i].
+    All rows advance their left pointer in lockstep, so the whole batch is
+    resolved in log2(longest segment) vectorized steps.
+    """
+    lo = lo.copy()
+    hi = np.arange(len(times))
+    active = np.flatnonzero(lo < hi)
+    while active.size:
+        mid = (lo[active] + hi[active]) >> 1
+        right = times[mid] <= bound[active]
+        lo[active[right]] = mid[right] + 1
+        hi[active[~right]] = mid[~right]
+        active = active[lo[active] < hi[active]]
+    return lo
+
+
+def velocity_features(index: GroupIndex, times: np.ndarray, amounts: np.ndarray,
+                      windows: List[str] = VELOCITY_WINDOWS) -> Dict[str, np.ndarray]:
+    """
+    Rolling per-user transaction count and amount sum for every window in one sweep.
+    Rows must be sorted by user and time; each window is right-closed, matching
+    `groupby("user_id").rolling(window)` on a time index.
+    """
+    t = np.asarray(times, dtype="datetime64[ns]").view("i8")
+    csum = np.concatenate([[0.0], np.cumsum(amounts, dtype=np.float64)])
+    rows = np.arange(len(t))
+
+    # Widest window first: each narrower window's left pointer can only sit
+    # at or after the previous one, which shrinks the search range.
+    lengths = {w: pd.Timedelta(w.lower()).value for w in windows}
+    left = index.row_starts
+    out = {}
+    for window in sorted(windows, key=lengths.get, reverse=True):
+        left = window_starts(t, left, t - lengths[window])
+        out[f"txn_count_{window}"] = (rows - left + 1).astype(np.float64)
+        out[f"amount_sum_{window}"] = csum[rows + 1] - csum[left]
+    return {key: out[key] for w in windows for key in (f"txn_count_{w}", f"amount_sum_{w}")}
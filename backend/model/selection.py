@@ -0,0 +1,41 @@
+from typing import Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+# Rows the rank correlations are measured on; redundancy shows up in any sizeable sample
+SAMPLE_ROWS = 20000
+
+
+def select_features(features: pd.DataFrame, max_corr: float = 0.95, near_constant: float = 0.9999,
+                    sample_rows: int = SAMPLE_ROWS, random_state: int = 42) -> Tuple[List[str], Dict[str, str]]:
+    """
+    Columns worth training on, in their original order, and why each other
+    column was dropped:
+      - constant, or near-constant: at least `near_constant` of the rows share
+        one value (measured against the median, which is that value whenever
+        it covers more than half the rows); rare flags well above that survive
+      - redundant: |Spearman correlation| above max_corr with an earlier
+        kept column, so monotone transforms (log, sqrt, square, z-score,
+        percentile) of a kept column go. Measured on sample_rows random rows.
+    """
+    share = features.eq(features.median()).mean()
+    dropped = {col: "constant" if share[col] == 1 else "near-constant"
+               for col in features.columns if share[col] >= near_constant}
+    candidates = [col for col in features.columns if col not in dropped]
+
+    sample = features[candidates]
+    if len(sample) > sample_rows:
+        rows = np.sort(np.random.default_rng(random_state).choice(len(sample), sample_rows, replace=False))
+        sample = sample.iloc[rows]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        corr = np.abs(np.corrcoef(sample.rank().to_numpy(dtype=np.float64), rowvar=False))
+    corr = np.nan_to_num(np.atleast_2d(corr), nan=0.0)
+
+    kept: List[int] = []
+    for j, col in enumerate(candidates):
+        if kept and corr[j, kept].max() > max_corr:
+            dropped[col] = f"correlated with {candidates[kept[int(np.argmax(corr[j, kept]))]]}"
+        else:
+            kept.append(j)
+    return [candidates[j] for j in kept], dropped
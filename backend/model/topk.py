@@ -0,0 +1,31 @@
+import numpy as np
+
+
+def top_k(values, k: int) -> np.ndarray:
+    """
+    Positions of the k largest values, largest first, as a stable descending
+    sort would give them (equal values keep their order; NaN ranks last).
+    argpartition finds the k-th largest in O(n) and only the k selected
+    values are sorted, so a few hundred rows out of millions cost
+    O(n + k log k) instead of a full sort.
+    """
+    values = np.asarray(values)
+    k = max(0, min(int(k), len(values)))
+    if values.dtype.kind == "f":
+        missing = np.isnan(values)
+        if missing.any():
+            present = np.flatnonzero(~missing)
+            ranked = present[top_k(values[present], k)]
+            return np.concatenate([ranked, np.flatnonzero(missing)[:k - len(ranked)]])
+    if k == len(values):
+        candidates = np.arange(len(values))
+    elif k == 0:
+        return np.empty(0, dtype=np.intp)
+    else:
+        kth = values[np.argpartition(values, len(values) - k)[len(values) - k]]
+        # Everything above the k-th largest, then the first of the values equal to it
+        above = np.flatnonzero(values > kth)
+        candidates = np.sort(np.concatenate([above, np.flatnonzero(values == kth)[:k - len(above)]]))
+    # Stable ascending sort of the reversed keys, reversed: descending, equal values in position order
+    descending = len(candidates) - 1 - np.argsort(values[candidates][::-1], kind="stable")[::-1]
+    return candidates[descending]